@@ -1,24 +1,42 @@
+import argparse
+import functools
+import json
 import os
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
 from mutagen.mp3 import MP3
 from mutagen.id3 import ID3, APIC
-import mysql.connector
 import hashlib
 
+import analysis
+import transcode
+from artwork import make_thumbnails
+from db import DatabaseError, get_db_connection, invalidate_catalog
+
 # --- Config ---
 SONG_DIR = "songs"
 COVER_DIR = "covers"
+CHECKPOINT_FILE = ".import_checkpoint"
+MANIFEST_FILE = ".import_manifest.jsonl"
+HASH_CHUNK_SIZE = 1024 * 1024
+# Audio bytes hashed to split files whose audio is the same length before
+# hashing them in full.
+PARTIAL_HASH_SIZE = 64 * 1024
+BATCH_SIZE = 500
 
-DB_CONFIG = {
-    "host": "localhost",
-    "user": "root",
-    "password": "MySQL_Abhuday",
-    "database": "DBMS_Project"
-}
-
+# Dummy values for now, update this to match your actual artist/album/genre IDs.
+# Migration 008 (sqlite/004) seeds rows under these ids.
+DEFAULT_ARTIST_ID = 1
+DEFAULT_ALBUM_ID = 1
+DEFAULT_GENRE_ID = 2
+DEFAULT_RELEASE_DATE = "2024-01-01"
 
-# --- DB Setup ---
-def get_db_connection():
-    return mysql.connector.connect(**DB_CONFIG)
+INSERT_SONG_SQL = """
+    INSERT INTO Songs (Title, artistId, albumId, genreId, releaseDate, audioFile, thumbnail,
+                       duration, loudness, replayGain, waveform)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
 
 
 # --- Extract cover and save it ---
@@ -31,6 +49,10 @@ def extract_cover_art(mp3_path, title):
                 path = os.path.join(COVER_DIR, filename)
                 with open(path, "wb") as img:
                     img.write(tag.data)
+                try:
+                    make_thumbnails(path)
+                except Exception as e:
+                    print(f"⚠️ Thumbnails failed for {title}: {e}")
                 return filename
     except Exception as e:
         print(f"⚠️ No cover found for {title}: {e}")
@@ -40,39 +62,559 @@ def extract_cover_art(mp3_path, title):
 # --- Insert into DB ---
 def insert_song(title, artist_id, album_id, genre_id, release_date, audio_file, thumbnail):
     conn = get_db_connection()
+    if not conn:
+        print(f"❌ Error inserting {title}: no database connection")
+        return
     cursor = conn.cursor()
     try:
-        cursor.execute("""
-            INSERT INTO Songs (Title, artistId, albumId, genre, releaseDate, audioFile, thumbnail)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (title, artist_id, album_id, genre_id, release_date, audio_file, thumbnail))
+        cursor.execute(INSERT_SONG_SQL, (title, artist_id, album_id, genre_id, release_date, audio_file, thumbnail,
+                                         None, None, None, None))
         conn.commit()
+        # Only clears this process's cache. Run from the command line, that
+        # is not the running app's: it picks the new songs up when its
+        # CATALOG_TTL entries expire and its search index next syncs.
+        invalidate_catalog()
         print(f"✅ Inserted: {title}")
-    except mysql.connector.Error as err:
+    except DatabaseError as err:
         print(f"❌ Error inserting {title}: {err}")
     finally:
         cursor.close()
         conn.close()
 
 
+def insert_songs(songs):
+    conn = get_db_connection()
+    if not conn:
+        print(f"❌ Error inserting batch of {len(songs)}: no database connection")
+        return False
+    cursor = conn.cursor()
+    try:
+        cursor.executemany(INSERT_SONG_SQL, [
+            (song["title"], song["artist_id"], song["album_id"], song["genre_id"],
+             song["release_date"], song["audio_file"], song["thumbnail"],
+             song["duration"], song["loudness"], song["replay_gain"], song["waveform"])
+            for song in songs
+        ])
+        conn.commit()
+        invalidate_catalog()
+        return True
+    except DatabaseError as err:
+        print(f"❌ Error inserting batch of {len(songs)}: {err}")
+        return False
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def existing_audio_files():
+    conn = get_db_connection()
+    if not conn:
+        return set()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT audioFile FROM Songs")
+        return {row[0] for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def update_song_files(changes):
+    # changes: [(old_audio_file, song dict)]; covers renames and re-encodes.
+    # Fields a rename doesn't know (None) keep their stored value.
+    conn = get_db_connection()
+    if not conn:
+        print(f"❌ Error updating {len(changes)} songs: no database connection")
+        return False
+    cursor = conn.cursor()
+    try:
+        cursor.executemany("""
+            UPDATE Songs SET Title = %s, audioFile = %s, thumbnail = COALESCE(%s, thumbnail),
+                duration = COALESCE(%s, duration), loudness = COALESCE(%s, loudness),
+                replayGain = COALESCE(%s, replayGain), waveform = COALESCE(%s, waveform)
+            WHERE audioFile = %s
+        """, [(song["title"], song["audio_file"], song["thumbnail"], song.get("duration"), song.get("loudness"),
+               song.get("replay_gain"), song.get("waveform"), old) for old, song in changes])
+        conn.commit()
+        invalidate_catalog()
+        return True
+    except DatabaseError as err:
+        print(f"❌ Error updating {len(changes)} songs: {err}")
+        return False
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def unanalyzed_audio_files():
+    conn = get_db_connection()
+    if not conn:
+        return []
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT audioFile FROM Songs WHERE duration IS NULL AND audioFile IS NOT NULL")
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def update_song_analysis(results):
+    # results: [(audio_file, analysis.analyze() dict)]
+    conn = get_db_connection()
+    if not conn:
+        print(f"❌ Error updating {len(results)} songs: no database connection")
+        return False
+    cursor = conn.cursor()
+    try:
+        cursor.executemany(
+            "UPDATE Songs SET duration = %s, loudness = %s, replayGain = %s, waveform = %s WHERE audioFile = %s",
+            [(result["duration"], result["loudness"], result["replay_gain"], result["waveform"], audio_file)
+             for audio_file, result in results])
+        conn.commit()
+        invalidate_catalog()
+        return True
+    except DatabaseError as err:
+        print(f"❌ Error updating {len(results)} songs: {err}")
+        return False
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def delete_songs(audio_files):
+    conn = get_db_connection()
+    if not conn:
+        print(f"❌ Error deleting {len(audio_files)} songs: no database connection")
+        return False
+    cursor = conn.cursor()
+    params = [(name,) for name in audio_files]
+    try:
+        cursor.executemany(
+            "DELETE FROM PlaylistSongs WHERE songId IN (SELECT song_id FROM Songs WHERE audioFile = %s)", params)
+        cursor.executemany("DELETE FROM Songs WHERE audioFile = %s", params)
+        conn.commit()
+        invalidate_catalog()
+        return True
+    except DatabaseError as err:
+        print(f"❌ Error deleting {len(audio_files)} songs: {err}")
+        return False
+    finally:
+        cursor.close()
+        conn.close()
+
+
+# --- Content hash (runs in a worker process) ---
+def audio_span(f, size):
+    # (start, end) of the MPEG frames: past any ID3v2 tags at the front,
+    # before an ID3v1 and/or APEv2 tag at the back. Retagging a file moves
+    # these bounds but not the bytes between them.
+    start = 0
+    while True:
+        f.seek(start)
+        header = f.read(10)
+        if len(header) < 10 or header[:3] != b"ID3":
+            break
+        tag_size = (header[6] & 0x7F) << 21 | (header[7] & 0x7F) << 14 | (header[8] & 0x7F) << 7 | header[9] & 0x7F
+        start += 10 + tag_size + (10 if header[5] & 0x10 else 0)
+    end = size
+    if end - start >= 128:
+        f.seek(end - 128)
+        if f.read(3) == b"TAG":
+            end -= 128
+    if end - start >= 32:
+        f.seek(end - 32)
+        footer = f.read(32)
+        if footer[:8] == b"APETAGEX":
+            tag_size, _, flags = struct.unpack("<III", footer[12:24])
+            end -= tag_size + (32 if flags & 0x80000000 else 0)
+    return start, max(start, min(end, size))
+
+
+def audio_length(filename):
+    path = os.path.join(SONG_DIR, filename)
+    with open(path, "rb") as f:
+        start, end = audio_span(f, os.fstat(f.fileno()).st_size)
+    return end - start
+
+
+def audio_hash(filename, limit=None):
+    # SHA-256 of the audio frames (the first `limit` bytes of them, if given).
+    digest = hashlib.sha256()
+    with open(os.path.join(SONG_DIR, filename), "rb") as f:
+        start, end = audio_span(f, os.fstat(f.fileno()).st_size)
+        if limit is not None:
+            end = min(end, start + limit)
+        f.seek(start)
+        while start < end:
+            chunk = f.read(min(HASH_CHUNK_SIZE, end - start))
+            if not chunk:
+                break
+            digest.update(chunk)
+            start += len(chunk)
+    return digest.hexdigest()
+
+
+def file_hash(filename):
+    # Whole-file and audio-only SHA-256 in one read: {"hash", "audio"}.
+    digest, audio = hashlib.sha256(), hashlib.sha256()
+    with open(os.path.join(SONG_DIR, filename), "rb") as f:
+        start, end = audio_span(f, os.fstat(f.fileno()).st_size)
+        f.seek(0)
+        offset = 0
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+            audio.update(chunk[max(start - offset, 0):max(end - offset, 0)])
+            offset += len(chunk)
+    return {"hash": digest.hexdigest(), "audio": audio.hexdigest()}
+
+
+def preferred(names):
+    # Of several copies keep "Song.mp3" over "Song (1).mp3".
+    return min(names, key=lambda name: (len(name), name))
+
+
+def find_duplicates(files, pool):
+    # {duplicate: kept file} for files whose audio frames are identical.
+    # Only files sharing an audio length get a partial hash, and only those
+    # still colliding are hashed in full.
+    groups = {}
+    for name, length in zip(files, pool.map(audio_length, files, chunksize=64)):
+        groups.setdefault(length, []).append(name)
+    candidates = [(length, names) for length, names in groups.items() if len(names) > 1]
+    partial = [name for _, names in candidates for name in names]
+    partial_hashes = dict(zip(partial, pool.map(functools.partial(audio_hash, limit=PARTIAL_HASH_SIZE),
+                                                partial, chunksize=16)))
+    collisions, complete = {}, set()
+    for length, names in candidates:
+        for name in names:
+            collisions.setdefault((length, partial_hashes[name]), []).append(name)
+            if length <= PARTIAL_HASH_SIZE:
+                complete.add(name)  # the partial hash already covers it all
+    full = [name for names in collisions.values() if len(names) > 1 for name in names if name not in complete]
+    full_hashes = dict(zip(full, pool.map(audio_hash, full, chunksize=16)))
+
+    duplicates = {}
+    for names in collisions.values():
+        same = {}
+        for name in names:
+            same.setdefault(full_hashes.get(name, partial_hashes[name]), []).append(name)
+        for copies in same.values():
+            keep = preferred(copies)
+            duplicates.update((name, keep) for name in copies if name != keep)
+    return duplicates
+
+
+def report_duplicates(duplicates):
+    if duplicates:
+        print(f"🧬 Skipping {len(duplicates)} duplicate files (same audio as an imported one):")
+        for name in sorted(duplicates):
+            print(f"   - {name} = {duplicates[name]}")
+
+
+# --- Parse one file (runs in a worker process) ---
+def analyze_file(filename):
+    return analysis.analyze(os.path.join(SONG_DIR, filename))
+
+
+def parse_song(filename, renditions=False, analyze=True):
+    title = os.path.splitext(filename)[0]
+    mp3_path = os.path.join(SONG_DIR, filename)
+    if renditions:
+        transcode.make_renditions(mp3_path)
+    return {
+        **(analysis.analyze(mp3_path) if analyze else
+           {"duration": None, "loudness": None, "replay_gain": None, "waveform": None}),
+        "title": title,
+        "artist_id": DEFAULT_ARTIST_ID,
+        "album_id": DEFAULT_ALBUM_ID,
+        "genre_id": DEFAULT_GENRE_ID,
+        "release_date": DEFAULT_RELEASE_DATE,
+        "audio_file": filename,
+        "thumbnail": extract_cover_art(mp3_path, title),
+    }
+
+
+# --- Checkpoint: files already committed by an interrupted run ---
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.rstrip("\n") for line in f if line.strip()}
+
+
+def append_checkpoint(path, filenames):
+    with open(path, "a", encoding="utf-8") as f:
+        f.writelines(f"{name}\n" for name in filenames)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+# --- Manifest: what the last sync saw on disk ---
+# Append-only JSON lines ({"path", "size", "mtime", "hash"} or {"path", "deleted"}),
+# so recording a batch is one small write; it is compacted after each sync.
+def load_manifest(path):
+    manifest = {}
+    if not os.path.exists(path):
+        return manifest
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("deleted"):
+                manifest.pop(record["path"], None)
+            else:
+                manifest[record["path"]] = record
+    return manifest
+
+
+def append_manifest(path, records):
+    with open(path, "a", encoding="utf-8") as f:
+        f.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def compact_manifest(path, manifest):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in manifest.values())
+    os.replace(tmp, path)
+
+
+class Progress:
+    def __init__(self, total, label="Imported"):
+        self.total = total
+        self.label = label
+        self.done = 0
+        self.failed = 0
+        self.started = time.perf_counter()
+
+    def update(self, count, ok=True):
+        if ok:
+            self.done += count
+        else:
+            self.failed += count
+        elapsed = time.perf_counter() - self.started
+        processed = self.done + self.failed
+        rate = processed / elapsed if elapsed else 0.0
+        eta = (self.total - processed) / rate if rate else 0.0
+        print(f"📦 {processed}/{self.total} files ({self.failed} failed) — {rate:.0f} files/s, ETA {eta:.0f}s")
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        rate = (self.done + self.failed) / elapsed if elapsed else 0.0
+        print(f"🏁 {self.label} {self.done} songs, {self.failed} failed, in {elapsed:.1f}s ({rate:.0f} files/s)")
+
+
 # --- Bulk Process ---
-def bulk_import():
+def bulk_import(workers=None, batch_size=BATCH_SIZE, checkpoint=CHECKPOINT_FILE, resume=True, renditions=False,
+                analyze=True):
+    os.makedirs(COVER_DIR, exist_ok=True)
+
+    if not resume and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    done = load_checkpoint(checkpoint)
+    if done:
+        print(f"↩️ Resuming: skipping {len(done)} files from {checkpoint}")
+
+    with os.scandir(SONG_DIR) as entries:
+        all_files = sorted(entry.name for entry in entries if entry.is_file() and entry.name.endswith(".mp3"))
+
+    def flush(batch):
+        # Only committed rows go into the checkpoint, so a crash never skips a file.
+        ok = insert_songs(batch)
+        if ok:
+            append_checkpoint(checkpoint, [song["audio_file"] for song in batch])
+        progress.update(len(batch), ok)
+        return ok
+
+    all_ok = True
+    batch = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Dedupe across the whole folder, so a resumed run keeps the same copies.
+        duplicates = find_duplicates(all_files, pool)
+        report_duplicates(duplicates)
+        files = [name for name in all_files if name not in done and name not in duplicates]
+        progress = Progress(len(files))
+        # Decoding for analysis makes each file far slower than a tag read,
+        # so hand them out in small chunks to keep every worker busy.
+        for song in pool.map(functools.partial(parse_song, renditions=renditions, analyze=analyze), files,
+                             chunksize=4 if analyze else 32):
+            batch.append(song)
+            if len(batch) >= batch_size:
+                all_ok = flush(batch) and all_ok
+                batch = []
+        if batch:
+            all_ok = flush(batch) and all_ok
+
+    progress.summary()
+    if all_ok and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return all_ok
+
+
+# --- Incremental sync ---
+def sync_library(workers=None, batch_size=BATCH_SIZE, manifest_path=MANIFEST_FILE, prune=False, renditions=False,
+                 analyze=True):
     os.makedirs(COVER_DIR, exist_ok=True)
+    manifest = load_manifest(manifest_path)
+
+    with os.scandir(SONG_DIR) as entries:
+        on_disk = {entry.name: entry.stat() for entry in entries
+                   if entry.is_file() and entry.name.endswith(".mp3")}
+
+    # Only files whose size or mtime moved get hashed at all, plus duplicates
+    # whose original was never recorded. Shortest names first, so of two new
+    # copies "Song.mp3" is the one imported.
+    suspects = sorted((name for name, st in on_disk.items()
+                       if name not in manifest
+                       or manifest[name]["size"] != st.st_size
+                       or manifest[name]["mtime"] != st.st_mtime_ns
+                       or manifest[name].get("duplicate_of") not in (None, *on_disk, *manifest)),
+                      key=lambda name: (len(name), name))
+    # Duplicates are in the manifest (with "duplicate_of") but have no row.
+    for name in [name for name, record in manifest.items() if name not in on_disk and record.get("duplicate_of")]:
+        del manifest[name]
+    vanished = {name: record for name, record in manifest.items() if name not in on_disk}
+    vanished_by_hash = {record["hash"]: name for name, record in vanished.items()}
+    by_audio = {record["audio"]: name for name, record in manifest.items()
+                if name in on_disk and record.get("audio") and not record.get("duplicate_of")}
+    # Files the manifest has never seen may still have rows (e.g. imported by
+    # a full run); adopt those instead of inserting them again.
+    in_db = existing_audio_files() if any(name not in manifest for name in suspects) else set()
+
+    new, changed, renamed, touched, duplicates = [], [], [], [], {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        hashes = dict(zip(suspects, pool.map(file_hash, suspects, chunksize=16)))
+        for name in suspects:
+            st = on_disk[name]
+            record = {"path": name, "size": st.st_size, "mtime": st.st_mtime_ns, **hashes[name]}
+            old = manifest.get(name)
+            if old and old.get("duplicate_of"):
+                old = None  # a duplicate that changed: check it again like a new file
+            if old:
+                (touched if old["hash"] == record["hash"] else changed).append(record)
+            elif name in in_db:
+                touched.append(record)
+            elif record["hash"] in vanished_by_hash:
+                renamed.append((vanished_by_hash.pop(record["hash"]), record))
+            elif record["audio"] in by_audio:
+                record["duplicate_of"] = by_audio[record["audio"]]
+                duplicates[name] = record["duplicate_of"]
+                touched.append(record)
+                continue
+            else:
+                new.append(record)
+            by_audio.setdefault(record["audio"], name)
+
+        # A duplicate whose original vanished takes over the original's row.
+        promoted = 0
+        for name, record in manifest.items():
+            original = record.get("duplicate_of")
+            if (name in on_disk and name not in hashes and original in vanished
+                    and vanished_by_hash.get(vanished[original]["hash"]) == original):
+                del vanished_by_hash[vanished[original]["hash"]]
+                renamed.append((original, {key: value for key, value in record.items() if key != "duplicate_of"}))
+                promoted += 1
+
+        print(f"🔍 {len(on_disk)} files: {len(new)} new, {len(changed)} changed, {len(renamed)} renamed, "
+              f"{len(duplicates)} duplicate, {len(vanished_by_hash)} missing, "
+              f"{len(on_disk) - len(suspects) + len(touched) - len(duplicates) - promoted} unchanged")
+        report_duplicates(duplicates)
+
+        if touched:
+            append_manifest(manifest_path, touched)
+            manifest.update((record["path"], record) for record in touched)
+
+        progress = Progress(len(new) + len(changed) + len(renamed), label="Synced")
+        all_ok = True
+
+        for start in range(0, len(renamed), batch_size):
+            batch = renamed[start:start + batch_size]
+            changes = [(old_name, {"title": os.path.splitext(record["path"])[0], "audio_file": record["path"],
+                                   "thumbnail": None}) for old_name, record in batch]
+            ok = update_song_files(changes)
+            if ok:
+                append_manifest(manifest_path, [{"path": old_name, "deleted": True} for old_name, _ in batch]
+                                + [record for _, record in batch])
+                for old_name, record in batch:
+                    manifest.pop(old_name, None)
+                    manifest[record["path"]] = record
+            progress.update(len(batch), ok)
+            all_ok = ok and all_ok
+
+        for records, write in ((new, insert_songs),
+                               (changed, lambda songs: update_song_files([(s["audio_file"], s) for s in songs]))):
+            for start in range(0, len(records), batch_size):
+                batch = records[start:start + batch_size]
+                songs = list(pool.map(functools.partial(parse_song, renditions=renditions, analyze=analyze),
+                                      [record["path"] for record in batch], chunksize=4 if analyze else 16))
+                ok = write(songs)
+                if ok:
+                    append_manifest(manifest_path, batch)
+                    manifest.update((record["path"], record) for record in batch)
+                progress.update(len(batch), ok)
+                all_ok = ok and all_ok
+
+    missing = sorted(vanished_by_hash.values())
+    if missing:
+        if prune:
+            if delete_songs(missing):
+                append_manifest(manifest_path, [{"path": name, "deleted": True} for name in missing])
+                for name in missing:
+                    manifest.pop(name, None)
+                print(f"🗑️ Removed {len(missing)} songs whose files are gone")
+            else:
+                all_ok = False
+        else:
+            print(f"⚠️ {len(missing)} songs have no file any more (rerun with --prune to delete them):")
+            for name in missing:
+                print(f"   - {name}")
 
-    for filename in os.listdir(SONG_DIR):
-        if filename.endswith(".mp3"):
-            title = os.path.splitext(filename)[0]
-            mp3_path = os.path.join(SONG_DIR, filename)
+    progress.summary()
+    compact_manifest(manifest_path, manifest)
+    return all_ok
 
-            # Dummy values for now, update this to match your actual artist/album/genre IDs
-            artist_id = 1
-            album_id = 1
-            genre_id = 2
-            release_date = "2024-01-01"
 
-            cover = extract_cover_art(mp3_path, title)
-            insert_song(title, artist_id, album_id, genre_id, release_date, filename, cover)
+# --- Backfill analysis for songs imported before it existed ---
+def analyze_missing(workers=None, batch_size=BATCH_SIZE):
+    files = [name for name in unanalyzed_audio_files() if os.path.exists(os.path.join(SONG_DIR, name))]
+    progress = Progress(len(files), label="Analyzed")
+    all_ok = True
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(files), batch_size):
+            batch = files[start:start + batch_size]
+            ok = update_song_analysis(list(zip(batch, pool.map(analyze_file, batch, chunksize=4))))
+            progress.update(len(batch), ok)
+            all_ok = ok and all_ok
+    progress.summary()
+    return all_ok
 
 
 if __name__ == "__main__":
-    bulk_import()
+    parser = argparse.ArgumentParser(description="Import songs/ into the Songs table")
+    parser.add_argument("--workers", type=int, default=None, help="tag-parsing processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows per INSERT batch")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE, help="resume file for interrupted runs")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and import everything")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only process files added, changed or renamed since the last sync")
+    parser.add_argument("--manifest", default=MANIFEST_FILE, help="manifest used by --incremental")
+    parser.add_argument("--prune", action="store_true", help="with --incremental, delete rows whose file vanished")
+    parser.add_argument("--transcode", action="store_true",
+                        help="also encode the low/high bitrate renditions now instead of on first play")
+    parser.add_argument("--no-analysis", action="store_true",
+                        help="skip decoding for duration, loudness and waveform (tags and covers only)")
+    parser.add_argument("--analyze-missing", action="store_true",
+                        help="only analyse songs already in the database that have no analysis yet")
+    args = parser.parse_args()
+    if args.analyze_missing:
+        analyze_missing(workers=args.workers, batch_size=args.batch_size)
+    elif args.incremental:
+        sync_library(workers=args.workers, batch_size=args.batch_size, manifest_path=args.manifest, prune=args.prune,
+                     renditions=args.transcode, analyze=not args.no_analysis)
+    else:
+        bulk_import(workers=args.workers, batch_size=args.batch_size, checkpoint=args.checkpoint,
+                    resume=not args.restart, renditions=args.transcode, analyze=not args.no_analysis)
@@ -0,0 +1,85 @@
+import colorsys
+import functools
+import hashlib
+import os
+import threading
+from io import BytesIO
+
+from PIL import Image, ImageDraw, ImageFont, features
+
+# --- Config ---
+COVER_DIR = "covers"
+THUMB_DIR = os.path.join(COVER_DIR, "thumbs")
+THUMB_SIZES = (150, 300)
+THUMB_FORMAT = "WEBP" if features.check("webp") else "JPEG"
+THUMB_EXT = ".webp" if THUMB_FORMAT == "WEBP" else ".jpg"
+THUMB_QUALITY = 80
+
+_hashes = {}
+_hashes_lock = threading.Lock()
+
+
+def source_hash(path):
+    # Hashing the source on every tile render would cost more than the
+    # thumbnail saves, so remember it per (path, size, mtime).
+    st = os.stat(path)
+    key = (path, st.st_size, st.st_mtime_ns)
+    with _hashes_lock:
+        digest = _hashes.get(key)
+    if digest is None:
+        with open(path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()[:16]
+        with _hashes_lock:
+            _hashes[key] = digest
+    return digest
+
+
+def _thumb_path(digest, size):
+    return os.path.join(THUMB_DIR, f"{digest}_{size}{THUMB_EXT}")
+
+
+def make_thumbnails(cover_path, sizes=THUMB_SIZES):
+    digest = source_hash(cover_path)
+    wanted = {size: _thumb_path(digest, size) for size in sizes}
+    missing = {size: path for size, path in wanted.items() if not os.path.exists(path)}
+    if missing:
+        os.makedirs(THUMB_DIR, exist_ok=True)
+        with Image.open(cover_path) as img:
+            img = img.convert("RGB")
+            for size, path in sorted(missing.items(), reverse=True):
+                thumb = img.copy()
+                thumb.thumbnail((size, size), Image.LANCZOS)
+                tmp = f"{path}.{os.getpid()}.tmp"
+                thumb.save(tmp, THUMB_FORMAT, quality=THUMB_QUALITY)
+                os.replace(tmp, path)
+    return wanted
+
+
+def thumbnail_path(cover_path, size=150):
+    try:
+        return make_thumbnails(cover_path, (size,))[size]
+    except Exception as e:
+        print(f"⚠️ Thumbnail failed for {cover_path}: {e}")
+        return cover_path
+
+
+@functools.lru_cache(maxsize=1024)
+def placeholder_cover(title, size=150):
+    # Rendered locally so covers without art need no network round-trip;
+    # the colour is derived from the title so each song keeps its own.
+    digest = hashlib.md5((title or "").encode()).digest()
+    r, g, b = colorsys.hls_to_rgb(digest[0] / 255, 0.35, 0.45)
+    img = Image.new("RGB", (size, size), (int(r * 255), int(g * 255), int(b * 255)))
+
+    words = [word for word in (title or "").split() if word[:1].isalnum()]
+    initials = "".join(word[0] for word in words[:2]).upper() or "?"
+    try:
+        font = ImageFont.load_default(size=size // 3)
+    except TypeError:
+        font = ImageFont.load_default()
+    draw = ImageDraw.Draw(img)
+    draw.text((size / 2, size / 2), initials, fill=(255, 255, 255), font=font, anchor="mm")
+
+    buffered = BytesIO()
+    img.save(buffered, format="PNG")
+    return buffered.getvalue()
@@ -0,0 +1,157 @@
+import hashlib
+import hmac
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+# --- Config ---
+BCRYPT_ROUNDS = int(os.environ.get("TREBLE_BCRYPT_ROUNDS", "12"))
+AUTH_WORKERS = int(os.environ.get("TREBLE_AUTH_WORKERS", str(os.cpu_count() or 2)))
+# Hash/verify jobs allowed in flight at once; the rest queue for a slot.
+AUTH_MAX_CONCURRENCY = int(os.environ.get("TREBLE_AUTH_MAX_CONCURRENCY", str(AUTH_WORKERS * 2)))
+AUTH_QUEUE_TIMEOUT = float(os.environ.get("TREBLE_AUTH_QUEUE_TIMEOUT", "10"))
+
+
+_BCRYPT_RE = re.compile(r"^\$2[abxy]?\$(\d{2})\$[./A-Za-z0-9]{53}$")
+_SHA256_RE = re.compile(r"^[0-9a-fA-F]{64}$")
+
+
+class AuthBusy(Exception):
+    pass
+
+
+# --- Stored hash formats ---
+def hash_scheme(hashed):
+    # Decided from the string itself so verification never has to try
+    # bcrypt first and fall back on the exception.
+    if not hashed:
+        return None
+    if _BCRYPT_RE.match(hashed):
+        return "bcrypt"
+    if _SHA256_RE.match(hashed):
+        return "sha256"
+    return None
+
+
+def needs_rehash(hashed, rounds=BCRYPT_ROUNDS):
+    match = _BCRYPT_RE.match(hashed or "")
+    return match is None or int(match.group(1)) < rounds
+
+
+# --- Work done on the pool threads ---
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)).decode()
+
+
+def _check(password, hashed):
+    return bcrypt.checkpw(password.encode(), hashed.encode())
+
+
+class AuthService:
+    def __init__(self, workers=AUTH_WORKERS, max_concurrency=AUTH_MAX_CONCURRENCY,
+                 queue_timeout=AUTH_QUEUE_TIMEOUT, rounds=BCRYPT_ROUNDS):
+        self.workers = workers
+        self.rounds = rounds
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = None
+        self._lock = threading.Lock()
+
+        self.max_concurrency = max_concurrency
+        self.completed = 0
+        self.rejected = 0
+        self.queued = 0
+        self.max_queued = 0
+        self.queue_time = 0.0
+        self.run_time = 0.0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # Threads, not processes: bcrypt releases the GIL while it
+                # hashes, and spawned workers would re-run the page script,
+                # which Streamlit installs as __main__.
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="treble-auth")
+            return self._executor
+
+    def _run(self, fn, *args):
+        start = time.perf_counter()
+        with self._lock:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+        with self._lock:
+            self.queued -= 1
+            if not acquired:
+                self.rejected += 1
+        if not acquired:
+            raise AuthBusy(f"authentication queue full ({self.max_concurrency} in flight)")
+
+        started = time.perf_counter()
+        try:
+            return self._get_executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+            with self._lock:
+                self.completed += 1
+                self.queue_time += started - start
+                self.run_time += time.perf_counter() - started
+
+    def hash_password(self, password):
+        return self._run(_hash, password, self.rounds)
+
+    def check_password(self, password, hashed):
+        return self._run(_check, password, hashed)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "rounds": self.rounds,
+                "max_concurrency": self.max_concurrency,
+                "queued": self.queued,
+                "max_queued": self.max_queued,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_queue_ms": self.queue_time / self.completed * 1000 if self.completed else 0.0,
+                "avg_run_ms": self.run_time / self.completed * 1000 if self.completed else 0.0,
+            }
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_service():
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = AuthService()
+    return _service
+
+
+def hash_password(password):
+    return get_service().hash_password(password)
+
+
+def check_password(password, hashed):
+    return get_service().check_password(password, hashed)
+
+
+def verify_password(password, hashed):
+    scheme = hash_scheme(hashed)
+    if scheme == "bcrypt":
+        return check_password(password, hashed)
+    if scheme == "sha256":
+        # Legacy unsalted digests from before bcrypt.
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), hashed.lower())
+    return False
+
+
+def auth_stats():
+    return get_service().stats()
@@ -0,0 +1,243 @@
+import functools
+import os
+import re
+import sqlite3
+from datetime import date, datetime
+
+# Storage backends behind db.py. Both hand out DB-API connections that
+# accept MySQL-style SQL (%s placeholders, cursor(dictionary=True),
+# callproc/stored_results); the SQL that genuinely differs between the two
+# dialects is built by the backend.
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+# A full scan of a table the optimizer expects to hold fewer rows than this
+# (a lookup table like Genres) costs no more than an index lookup.
+TRIVIAL_TABLE_ROWS = 100
+
+
+class MySQLBackend:
+    name = "mysql"
+    migrations_dir = MIGRATIONS_DIR
+
+    def __init__(self, config):
+        # Imported here so the SQLite backend works without the driver.
+        import mysql.connector
+        self._connector = mysql.connector
+        self.Error = mysql.connector.Error
+        self.config = config
+
+    def connect(self):
+        return self._connector.connect(**self.config)
+
+    def ping(self, conn):
+        conn.ping(reconnect=False)
+        return True
+
+    def upsert(self, key, columns):
+        return "ON DUPLICATE KEY UPDATE " + ", ".join(f"{col} = VALUES({col})" for col in columns)
+
+    def explain(self, conn, sql, params):
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute("EXPLAIN " + sql, params)
+            return cur.fetchall()
+        finally:
+            cur.close()
+
+    def full_scans(self, conn, sql, params):
+        # Every type=ALL, whether or not the optimizer had candidate keys:
+        # ignoring an index is as much a regression as not having one. Only
+        # materialised subqueries (<derived2>, <subquery2>) and tables it
+        # expects to be tiny are let through.
+        return [row["table"] for row in self.explain(conn, sql, params)
+                if row.get("type") == "ALL" and not str(row.get("table")).startswith("<")
+                and (row.get("rows") or 0) >= TRIVIAL_TABLE_ROWS]
+
+
+# --- SQLite ---
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+
+
+def _converter(parse):
+    # SQLite stores whatever it is given; hand back text MySQL would have
+    # refused rather than failing the whole fetch.
+    def convert(value):
+        text = value.decode()
+        try:
+            return parse(text)
+        except ValueError:
+            return text
+    return convert
+
+
+sqlite3.register_converter("DATE", _converter(date.fromisoformat))
+sqlite3.register_converter("DATETIME", _converter(datetime.fromisoformat))
+
+SQLITE_STATEMENT_CACHE = 256
+
+# Stand-ins for the MySQL stored procedures in migrations/003_procedures.sql (and 006).
+SQLITE_PROCEDURES = {
+    "GetTopSongs": """
+        SELECT s.song_id, s.Title, s.audioFile, s.thumbnail, s.duration, s.replayGain,
+               COUNT(ps.songId) AS playlist_count
+        FROM Songs s
+        LEFT JOIN PlaylistSongs ps ON ps.songId = s.song_id
+        GROUP BY s.song_id, s.Title, s.audioFile, s.thumbnail, s.duration, s.replayGain
+        ORDER BY playlist_count DESC, s.song_id
+        LIMIT ?
+    """,
+    "BatchInsertSongs": """
+        INSERT INTO Songs (Title, artistId, albumId, genreId, releaseDate, audioFile, thumbnail)
+        SELECT json_extract(value, '$.Title'), json_extract(value, '$.artistId'),
+               json_extract(value, '$.albumId'), json_extract(value, '$.genreId'),
+               json_extract(value, '$.releaseDate'), json_extract(value, '$.audioFile'),
+               json_extract(value, '$.thumbnail')
+        FROM json_each(?)
+    """,
+}
+
+_PLACEHOLDER_RE = re.compile(r"%[s%]")
+
+
+@functools.lru_cache(maxsize=SQLITE_STATEMENT_CACHE)
+def _translate(sql):
+    # %s -> ?, %% -> %. The result is stable per query text, so sqlite3's
+    # own statement cache keeps each one prepared across calls.
+    return _PLACEHOLDER_RE.sub(lambda m: "?" if m.group() == "%s" else "%", sql)
+
+
+class _ResultSet:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def fetchall(self):
+        return self._rows
+
+
+class SQLiteCursor:
+    def __init__(self, cur, dictionary=False):
+        self._cur = cur
+        self._dictionary = dictionary
+        self._results = []
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {col[0]: value for col, value in zip(self._cur.description, row)}
+
+    def execute(self, sql, params=None):
+        if params is None:
+            self._cur.execute(sql)
+        else:
+            self._cur.execute(_translate(sql), tuple(params))
+
+    def executemany(self, sql, seq_params):
+        self._cur.executemany(_translate(sql), [tuple(params) for params in seq_params])
+
+    def callproc(self, name, args=()):
+        self._cur.execute(SQLITE_PROCEDURES[name], tuple(args))
+        self._results = [_ResultSet(self.fetchall())] if self._cur.description else []
+        return args
+
+    def stored_results(self):
+        return iter(self._results)
+
+    def fetchone(self):
+        return self._row(self._cur.fetchone())
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cur.fetchall()]
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cur.lastrowid
+
+    def close(self):
+        self._cur.close()
+
+
+class SQLiteConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, dictionary=False):
+        return SQLiteCursor(self._conn.cursor(), dictionary=dictionary)
+
+    @property
+    def in_transaction(self):
+        return self._conn.in_transaction
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+class SQLiteBackend:
+    name = "sqlite"
+    migrations_dir = os.path.join(MIGRATIONS_DIR, "sqlite")
+    Error = sqlite3.Error
+
+    def __init__(self, path, busy_timeout=5.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+
+    def connect(self):
+        # Pooled connections move between Streamlit's threads, one at a time.
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, check_same_thread=False,
+                               detect_types=sqlite3.PARSE_DECLTYPES,
+                               cached_statements=SQLITE_STATEMENT_CACHE,
+                               uri=self.path.startswith("file:"))
+        # WAL lets readers run alongside the single writer.
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return SQLiteConnection(conn)
+
+    def ping(self, conn):
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.close()
+        return True
+
+    def upsert(self, key, columns):
+        return (f"ON CONFLICT ({key}) DO UPDATE SET "
+                + ", ".join(f"{col} = excluded.{col}" for col in columns))
+
+    def explain(self, conn, sql, params):
+        cur = conn.cursor()
+        try:
+            cur.execute("EXPLAIN QUERY PLAN " + sql, params)
+            return [detail for _, _, _, detail in cur.fetchall()]
+        finally:
+            cur.close()
+
+    def full_scans(self, conn, sql, params):
+        # "SCAN t" reads every row; "SCAN t USING INDEX" is an ordered
+        # index walk, the same as MySQL's type=index.
+        return [match.group(1) for detail in self.explain(conn, sql, params)
+                for match in [re.fullmatch(r"SCAN (\w+)", detail)] if match]
+
+
+def create(name, mysql_config, sqlite_path):
+    if name == "mysql":
+        return MySQLBackend(mysql_config)
+    if name == "sqlite":
+        return SQLiteBackend(sqlite_path)
+    raise ValueError(f"unknown TREBLE_DB_BACKEND {name!r} (expected 'mysql' or 'sqlite')")
@@ -0,0 +1,355 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from search_bench import GENRES, make_catalog  # noqa: E402
+
+PAGES = ["Home", "Browse", "Playlists", "Profile"]
+BENCH_PASSWORD = "benchmark-1!"
+# Changes smaller than this are noise at any threshold.
+MIN_REGRESSION_MS = 0.5
+
+
+def percentile(sorted_values, p):
+    return sorted_values[min(int(len(sorted_values) * p / 100), len(sorted_values) - 1)]
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {"p50_ms": percentile(timings, 50), "p95_ms": percentile(timings, 95),
+            "p99_ms": percentile(timings, 99)}
+
+
+# --- Synthetic data ---
+def populate(db, auth, n, seed=7):
+    rng = random.Random(seed)
+    songs = list(make_catalog(n, seed))
+    genre_ids = {name: i for i, name in enumerate(GENRES, 1)}
+    artist_ids, album_ids = {}, {}
+    for song in songs:
+        artist_ids.setdefault(song["artist"], len(artist_ids) + 1)
+        album_ids.setdefault(song["album"], len(album_ids) + 1)
+
+    users = max(n // 50, 20)
+    password = auth._hash(BENCH_PASSWORD, auth.BCRYPT_ROUNDS)
+    start = datetime(2020, 1, 1)
+    now = datetime.now()
+
+    conn = db.get_db_connection()
+    cur = conn.cursor()
+    # The catalog brings its own ids; drop the importer's seeded defaults.
+    for table in ("Albums", "Artists", "Genres"):
+        cur.execute(f"DELETE FROM {table}")
+    cur.executemany("INSERT INTO Genres (genreId, genreName) VALUES (%s, %s)",
+                    [(i, name) for name, i in genre_ids.items()])
+    cur.executemany("INSERT INTO Artists (artistId, artistName) VALUES (%s, %s)",
+                    [(i, name) for name, i in artist_ids.items()])
+    cur.executemany("INSERT INTO Albums (albumId, albumName) VALUES (%s, %s)",
+                    [(i, name) for name, i in album_ids.items()])
+    cur.executemany("""
+        INSERT INTO Songs (song_id, Title, artistId, albumId, genreId, releaseDate, audioFile, thumbnail)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """, [(s["song_id"], s["Title"], artist_ids[s["artist"]], album_ids[s["album"]], genre_ids[s["genre"]],
+           (start + timedelta(days=rng.randrange(2000))).date(), s["audioFile"], None) for s in songs])
+    cur.executemany("INSERT INTO Users (user_id, name, password, subscription_type, date_joined) VALUES (%s, %s, %s, %s, %s)",
+                    [(i, f"user{i}", password, rng.choice(["Free", "Premium"]), start.date())
+                     for i in range(1, users + 1)])
+
+    playlists, playlist_songs = [], set()
+    for user_id in range(1, users + 1):
+        for k in range(3):
+            playlist_id = len(playlists) + 1
+            playlists.append((playlist_id, user_id, f"Playlist {k + 1}"))
+            for _ in range(15):
+                playlist_songs.add((playlist_id, rng.randint(1, n)))
+    cur.executemany("INSERT INTO Playlists (playlistId, userId, name) VALUES (%s, %s, %s)", playlists)
+    cur.executemany("INSERT INTO PlaylistSongs (playlistId, songId) VALUES (%s, %s)", sorted(playlist_songs))
+
+    # Plays skewed towards a few hits, spread over the last week.
+    hits = [rng.randint(1, n) for _ in range(max(n // 100, 10))]
+    cur.executemany("INSERT INTO PlayEvents (userId, songId, playedAt) VALUES (%s, %s, %s)", [
+        (rng.randint(1, users), rng.choice(hits) if rng.random() < 0.8 else rng.randint(1, n),
+         now - timedelta(seconds=rng.randrange(7 * 86400)))
+        for _ in range(min(n * 2, 200000))])
+    conn.commit()
+    cur.close()
+    conn.close()
+    db.refresh_play_counts()
+    return songs, users, len(playlists)
+
+
+# --- db.py functions ---
+def db_calls(db, rng, songs, users, playlists):
+    def song():
+        return rng.choice(songs)
+
+    def word():
+        return max(song()["Title"].split(), key=len).lower()
+
+    new_users = []
+
+    def signup():
+        user_id = db.signup_user(f"bench{len(new_users)}_{rng.random()}", BENCH_PASSWORD, "Free")
+        new_users.append(user_id)
+
+    def delete_user():
+        if new_users:
+            db.delete_user(new_users.pop())
+
+    reads = {
+        "user_exists": lambda: db.user_exists(f"user{rng.randint(1, users)}"),
+        "login_user": lambda: db.login_user(f"user{rng.randint(1, users)}", BENCH_PASSWORD),
+        "get_user_name": lambda: db.get_user_name(rng.randint(1, users)),
+        "get_user_profile": lambda: db.get_user_profile(rng.randint(1, users)),
+        "count_legacy_passwords": db.count_legacy_passwords,
+        "get_top_songs": lambda: db.get_top_songs(12),
+        "get_play_counts": lambda: db.get_play_counts(100),
+        "get_recent_songs": lambda: db.get_recent_songs(5),
+        "get_all_genres": db.get_all_genres,
+        "get_songs": lambda: db.get_songs(after=rng.randint(0, len(songs)), limit=24),
+        "get_songs_search": lambda: db.get_songs(word(), limit=24),
+        "search_songs": lambda: db.search_songs(word(), genre=rng.choice(GENRES), limit=24),
+        "get_all_song_titles": db.get_all_song_titles,
+        "get_song_id_by_title": lambda: db.get_song_id_by_title(song()["Title"]),
+        "playlist_exists": lambda: db.playlist_exists(rng.randint(1, users), "Playlist 1"),
+        "get_user_playlists": lambda: db.get_user_playlists(rng.randint(1, users)),
+        "get_user_playlists_with_songs": lambda: db.get_user_playlists_with_songs(rng.randint(1, users)),
+        "search_song_titles": lambda: db.search_song_titles(song()["Title"][:3]),
+    }
+    # Cached catalog reads, timed again with the cache emptied before each call.
+    cold = {
+        "get_top_songs": "top_songs",
+        "get_recent_songs": "recent_songs",
+        "get_all_genres": "genres",
+        "get_all_song_titles": "song_titles",
+        "count_legacy_passwords": "legacy_passwords",
+    }
+    writes = {
+        "signup_user": signup,
+        "create_playlist": lambda: db.create_playlist(rng.randint(1, users), f"Bench {rng.random()}"),
+        "add_song_to_playlist": lambda: db.add_song_to_playlist(rng.randint(1, playlists), rng.randint(1, len(songs))),
+        "change_password": lambda: db.change_password(rng.randint(1, users), BENCH_PASSWORD),
+        "update_subscription": lambda: db.update_subscription(rng.randint(1, users), rng.choice(["Free", "Premium"])),
+        "insert_play_events": lambda: db.insert_play_events(
+            [(rng.randint(1, users), rng.randint(1, len(songs)), datetime.now()) for _ in range(200)]),
+        "refresh_play_counts": db.refresh_play_counts,
+        "batch_insert_songs": lambda: db.batch_insert_songs(
+            [{"Title": f"Bench {rng.random()}", "audioFile": None} for _ in range(50)]),
+        "delete_user": delete_user,
+    }
+    return reads, cold, writes
+
+
+def query_count():
+    import instrument
+    return sum(instrument.metrics.queries.values())
+
+
+def time_call(fn, repeat, before=None):
+    fn()  # warm-up, so pool growth and worker start-up stay out of the percentiles
+    timings = []
+    queries = query_count()
+    for _ in range(repeat):
+        if before:
+            before()
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    result = summarize(timings)
+    result["queries"] = (query_count() - queries) / repeat
+    return result
+
+
+# --- Streamlit pages ---
+def page_bytes(node):
+    # Serialized size of every element the script sent to the browser.
+    size = node.proto.ByteSize() if getattr(node, "proto", None) is not None else 0
+    for child in getattr(node, "children", {}).values():
+        size += page_bytes(child)
+    return size
+
+
+def time_pages(repeat, user_id):
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.testing.v1 import AppTest
+
+    media = {"bytes": 0}
+    load = MemoryMediaFileStorage.load_and_get_id
+
+    def counting_load(self, path_or_data, *args, **kwargs):
+        if isinstance(path_or_data, bytes):
+            media["bytes"] += len(path_or_data)
+        elif isinstance(path_or_data, str) and os.path.exists(path_or_data):
+            media["bytes"] += os.path.getsize(path_or_data)
+        return load(self, path_or_data, *args, **kwargs)
+
+    MemoryMediaFileStorage.load_and_get_id = counting_load
+    results = {}
+    try:
+        at = AppTest.from_file(os.path.join(ROOT, "main.py"), default_timeout=120)
+        at.session_state["user_id"] = user_id
+        at.run()
+        for page in PAGES:
+            at.sidebar.radio[1].set_value(page)
+            start = time.perf_counter()
+            at.run()
+            first_ms = (time.perf_counter() - start) * 1000
+            if at.exception:
+                raise RuntimeError(f"{page} page raised: {at.exception[0].value}")
+
+            timings = []
+            queries = query_count()
+            for _ in range(repeat):
+                media["bytes"] = 0
+                start = time.perf_counter()
+                at.run()
+                timings.append((time.perf_counter() - start) * 1000)
+            result = summarize(timings)
+            result.update({
+                "first_ms": first_ms,
+                "queries": (query_count() - queries) / repeat,
+                "element_bytes": page_bytes(at._tree),
+                "media_bytes": media["bytes"],
+            })
+            results[page] = result
+    finally:
+        MemoryMediaFileStorage.load_and_get_id = load
+    return results
+
+
+def bench_size(n, repeat, page_repeat, workdir):
+    # Runs in its own process: db.py reads its backend settings at import
+    # and keeps process-wide caches, so each catalog gets a clean slate.
+    path = os.path.join(workdir, f"bench_{n}.db")
+    os.environ["TREBLE_DB_BACKEND"] = "sqlite"
+    os.environ["TREBLE_SQLITE_PATH"] = path
+    # bcrypt cost is a tuning knob of its own; keep it from drowning the
+    # database timings unless asked for.
+    os.environ.setdefault("TREBLE_BCRYPT_ROUNDS", "4")
+    os.chdir(ROOT)
+
+    import auth
+    import db
+    import migrate
+
+    if not migrate.migrate():
+        raise RuntimeError("migrations failed")
+    start = time.perf_counter()
+    songs, users, playlists = populate(db, auth, n)
+    populate_s = time.perf_counter() - start
+    start = time.perf_counter()
+    db.sync_search_index(full=True)
+    index_s = time.perf_counter() - start
+
+    rng = random.Random(n)
+    reads, cold, writes = db_calls(db, rng, songs, users, playlists)
+    functions = {name: time_call(fn, repeat) for name, fn in reads.items()}
+    for name, cache_name in cold.items():
+        functions[f"{name}[cold]"] = time_call(reads[name], repeat, before=lambda name=cache_name: db.invalidate(name))
+    pages = time_pages(page_repeat, user_id=1)
+    functions.update({name: time_call(fn, repeat) for name, fn in writes.items()})
+
+    return {
+        "songs": n, "users": users, "playlists": playlists,
+        "populate_s": populate_s, "search_index_s": index_s,
+        "functions": functions, "pages": pages,
+    }
+
+
+# --- Comparison ---
+def compare(baseline, current, threshold):
+    regressions = []
+    for size, result in current["sizes"].items():
+        base = baseline["sizes"].get(size)
+        if base is None:
+            continue
+        for group in ("functions", "pages"):
+            for name, stats in result[group].items():
+                old = base[group].get(name)
+                if old is None:
+                    continue
+                before, after = old["p95_ms"], stats["p95_ms"]
+                if after > before * (1 + threshold) and after - before > MIN_REGRESSION_MS:
+                    regressions.append((size, group, name, before, after))
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time db.py functions and the Streamlit pages on synthetic catalogs")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="catalog sizes, comma-separated")
+    parser.add_argument("--repeat", type=int, default=50, help="calls per db function")
+    parser.add_argument("--page-repeat", type=int, default=5, help="reruns per page")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", metavar="BASELINE", help="fail if any p95 regressed against this results file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p95 slowdown for --compare (0.2 = 20%%)")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        result = bench_size(args.single, args.repeat, args.page_repeat, args.workdir)
+        with open(os.path.join(args.workdir, f"result_{args.single}.json"), "w") as f:
+            json.dump(result, f)
+        return
+
+    results = {
+        "commit": git_commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "backend": "sqlite",
+        "sizes": {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for n in (int(size) for size in args.sizes.split(",")):
+            print(f"Benchmarking {n} songs...", flush=True)
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--single", str(n), "--workdir", workdir,
+                            "--repeat", str(args.repeat), "--page-repeat", str(args.page_repeat)],
+                           check=True, stdout=subprocess.DEVNULL)
+            with open(os.path.join(workdir, f"result_{n}.json")) as f:
+                results["sizes"][str(n)] = json.load(f)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    for size, result in results["sizes"].items():
+        print(f"\n{size} songs (populate {result['populate_s']:.1f}s, search index {result['search_index_s']:.1f}s)")
+        print(f"{'function':<34} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}")
+        for name, r in result["functions"].items():
+            print(f"{name:<34} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['queries']:>8.1f}")
+        print(f"{'page':<12} {'first ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'queries':>8} {'elem KB':>8} {'media KB':>9}")
+        for name, r in result["pages"].items():
+            print(f"{name:<12} {r['first_ms']:>9.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['queries']:>8.1f} "
+                  f"{r['element_bytes'] / 1024:>8.1f} {r['media_bytes'] / 1024:>9.1f}")
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.threshold)
+        for size, group, name, before, after in regressions:
+            print(f"❌ {size} songs, {name}: p95 {before:.2f} ms -> {after:.2f} ms")
+        if regressions:
+            sys.exit(1)
+        print(f"✅ No p95 regressions over {args.threshold:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
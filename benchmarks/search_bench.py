@@ -0,0 +1,123 @@
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search import SearchIndex  # noqa: E402
+
+SYLLABLES = (
+    "ka ri no ma sa la te do re mi fa so lu be an el or un in ar on ex "
+    "ber tan vel mor sin dar kel fen gor han jas lin mer nor pal quin ros "
+    "sol tor vin wen yar zel bri cha dra fro gla pri stu tre"
+).split()
+GENRES = ["Pop", "Rock", "Hip Hop", "Bollywood", "Anime", "Jazz", "Electronic", "Indie"]
+VOCAB_SIZE = 20000
+
+
+def make_vocabulary(rng):
+    words = set()
+    while len(words) < VOCAB_SIZE:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4))))
+    return sorted(words)
+
+
+def make_catalog(n, seed=7):
+    rng = random.Random(seed)
+    vocab = make_vocabulary(rng)
+    # Zipf-like word frequencies, as in real titles: a few very common words
+    # ("love", "night") and a long tail.
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocab))))
+
+    def phrase(lo, hi):
+        return " ".join(rng.choices(vocab, cum_weights=cum_weights, k=rng.randint(lo, hi))).title()
+
+    artists = [phrase(1, 2) for _ in range(max(n // 20, 1))]
+    albums = [phrase(1, 3) for _ in range(max(n // 10, 1))]
+    for song_id in range(1, n + 1):
+        yield {
+            "song_id": song_id,
+            "Title": phrase(1, 4),
+            "audioFile": f"{song_id}.mp3",
+            "thumbnail": None,
+            "artist": rng.choice(artists),
+            "album": rng.choice(albums),
+            "genre": rng.choice(GENRES),
+        }
+
+
+def make_queries(songs, rng):
+    titles = [song["Title"].lower() for song in rng.sample(songs, 20)]
+    queries = []
+    for title in titles:
+        word = max(title.split(), key=len)
+        queries.append(word)                                      # exact word
+        queries.append(word[:max(len(word) // 2, 2)])             # typing a prefix
+        if len(word) > 4:
+            queries.append(word[:2] + word[3] + word[2] + word[4:])  # transposition typo
+        queries.append(title)                                     # full title
+    return queries
+
+
+def time_queries(fn, queries, repeat):
+    timings = []
+    for query in queries:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn(query)
+            timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def bench(n, repeat):
+    songs = list(make_catalog(n))
+    queries = make_queries(songs, random.Random(n))
+
+    # Baseline: the LIKE '%q%' path db.get_songs used, on an indexed column.
+    sql = sqlite3.connect(":memory:")
+    sql.execute("CREATE TABLE Songs (song_id INTEGER PRIMARY KEY, Title TEXT, audioFile TEXT, thumbnail TEXT)")
+    sql.execute("CREATE INDEX idx_songs_title ON Songs (Title)")
+    sql.executemany("INSERT INTO Songs VALUES (?, ?, ?, ?)",
+                    [(s["song_id"], s["Title"], s["audioFile"], s["thumbnail"]) for s in songs])
+    like_p50, like_p95 = time_queries(
+        lambda q: sql.execute("SELECT song_id, Title, audioFile, thumbnail FROM Songs WHERE Title LIKE ?",
+                              (f"%{q}%",)).fetchall(),
+        queries, repeat)
+
+    start = time.perf_counter()
+    index = SearchIndex()
+    index.add_many(songs)
+    build_s = time.perf_counter() - start
+    full_p50, full_p95 = time_queries(lambda q: index.search(q), queries, repeat)
+    page_p50, page_p95 = time_queries(lambda q: index.search(q, limit=24), queries, repeat)
+
+    return {
+        "songs": n,
+        "build_s": build_s,
+        "like_p50_ms": like_p50, "like_p95_ms": like_p95,
+        "index_p50_ms": full_p50, "index_p95_ms": full_p95,
+        "page_p50_ms": page_p50, "page_p95_ms": page_p95,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trigram search index vs. LIKE '%q%' scan")
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'songs':>9} {'build s':>8} {'LIKE p50':>9} {'LIKE p95':>9} {'idx p50':>9} {'idx p95':>9} {'page p50':>9} {'page p95':>9}")
+    for n in (int(size) for size in args.sizes.split(",")):
+        r = bench(n, args.repeat)
+        print(f"{r['songs']:>9} {r['build_s']:>8.1f} {r['like_p50_ms']:>9.2f} {r['like_p95_ms']:>9.2f} "
+              f"{r['index_p50_ms']:>9.2f} {r['index_p95_ms']:>9.2f} {r['page_p50_ms']:>9.2f} {r['page_p95_ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_MAX_ENTRIES = int(os.environ.get("TREBLE_CACHE_MAX_ENTRIES", "256"))
+
+
+class TTLCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._data[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *names):
+        # Keys are (name, args, kwargs); dropping by name clears every
+        # argument variant of a query, e.g. all get_recent_songs limits.
+        with self._lock:
+            if not names:
+                dropped = len(self._data)
+                self._data.clear()
+            else:
+                stale = [key for key in self._data if key[0] in names]
+                for key in stale:
+                    del self._data[key]
+                dropped = len(stale)
+            self.invalidations += dropped
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+catalog_cache = TTLCache()
+
+
+def cached(name, ttl, default=None):
+    # func returns None when its query failed: that isn't cached, and callers
+    # get default() instead. Anything else, empty results included, is.
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (name, args, tuple(sorted(kwargs.items())))
+            found, value = catalog_cache.get(key)
+            if found:
+                return value
+            value = func(*args, **kwargs)
+            if value is None:
+                return default() if default else None
+            catalog_cache.set(key, value, ttl)
+            return value
+        return wrapper
+    return decorator
+
+
+def invalidate(*names):
+    catalog_cache.invalidate(*names)
+
+
+def cache_stats():
+    return catalog_cache.stats()
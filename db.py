@@ -1,35 +1,194 @@
-import mysql.connector
-import hashlib
+import contextvars
+import os
 import re
-import bcrypt
+import threading
+import time
 import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import auth
+import backends
+import instrument
+from cache import cache_stats, cached, invalidate
+from pool import ConnectionPool
+from search import SearchIndex
+from trending import leaderboard
+
+DB_BACKEND = os.environ.get("TREBLE_DB_BACKEND", "mysql")
+SQLITE_PATH = os.environ.get("TREBLE_SQLITE_PATH", "treble.db")
+
+DB_CONFIG = {
+    "host": os.environ.get("TREBLE_DB_HOST", "localhost"),
+    "port": int(os.environ.get("TREBLE_DB_PORT", "3306")),
+    "user": os.environ.get("TREBLE_DB_USER", "root"),
+    "password": os.environ.get("TREBLE_DB_PASSWORD", ""),
+    "database": os.environ.get("TREBLE_DB_NAME", "DBMS_Project"),
+}
+
+POOL_CONFIG = {
+    "size": int(os.environ.get("TREBLE_DB_POOL_SIZE", "5")),
+    "timeout": float(os.environ.get("TREBLE_DB_POOL_TIMEOUT", "5")),
+    "reconnect_attempts": int(os.environ.get("TREBLE_DB_RECONNECT_ATTEMPTS", "3")),
+}
+
+# Threads that run gather() calls; more than the pool has connections would
+# only wait for one.
+FETCH_WORKERS = int(os.environ.get("TREBLE_DB_FETCH_WORKERS", str(POOL_CONFIG["size"])))
+
+backend = backends.create(DB_BACKEND, DB_CONFIG, SQLITE_PATH)
+DatabaseError = backend.Error
+
+# Seconds each shared catalog query may be served from the process cache.
+CATALOG_TTL = {
+    "top_songs": 60,
+    "recent_songs": 60,
+    "genres": 600,
+    "song_titles": 300,
+}
+# The legacy password gauge counts over all of Users; scrapes share one count
+# for this many seconds.
+LEGACY_PASSWORD_TTL = 300
+
+# Seconds between incremental pulls of newly inserted songs into the search index.
+SEARCH_SYNC_INTERVAL = 30
+# Seconds between full rebuilds, which also drop renamed and deleted songs.
+SEARCH_REBUILD_INTERVAL = 3600
+
+SEARCH_DOCS_QUERY = """
+    SELECT s.song_id, s.Title, s.audioFile, s.thumbnail, s.duration, s.replayGain,
+           ar.artistName AS artist, al.albumName AS album, g.genreName AS genre
+    FROM Songs s
+    LEFT JOIN Artists ar ON ar.artistId = s.artistId
+    LEFT JOIN Albums al ON al.albumId = s.albumId
+    LEFT JOIN Genres g ON g.genreId = s.genreId
+    WHERE s.song_id > %s
+    ORDER BY s.song_id
+"""
+
+# The statements behind every page view. migrate.py --check EXPLAINs these
+# same strings, so keep them here rather than inline.
+USER_EXISTS_QUERY = "SELECT 1 FROM Users WHERE name = %s"
+LOGIN_USER_QUERY = "SELECT user_id, password FROM Users WHERE name = %s"
+PLAYLIST_EXISTS_QUERY = "SELECT 1 FROM Playlists WHERE userId = %s AND name = %s"
+USER_PLAYLISTS_QUERY = """
+    SELECT
+        p.playlistId,
+        p.name,
+        COUNT(ps.songId) AS song_count
+    FROM Playlists p
+    LEFT JOIN PlaylistSongs ps ON ps.playlistId = p.playlistId
+    WHERE p.userId = %s
+    GROUP BY p.playlistId, p.name
+"""
+USER_PLAYLISTS_WITH_SONGS_QUERY = """
+    SELECT p.playlistId, p.name, s.song_id, s.Title, s.audioFile, s.duration, s.replayGain
+    FROM Playlists p
+    LEFT JOIN PlaylistSongs ps ON ps.playlistId = p.playlistId
+    LEFT JOIN Songs s ON s.song_id = ps.songId
+    WHERE p.userId = %s
+    ORDER BY p.playlistId
+"""
+SONG_ID_BY_TITLE_QUERY = "SELECT song_id FROM Songs WHERE Title = %s"
+SONG_EXISTS_QUERY = "SELECT 1 FROM Songs WHERE song_id = %s"
+SONG_TITLE_PREFIX_QUERY = "SELECT song_id, Title FROM Songs WHERE Title LIKE %s ESCAPE '!' ORDER BY Title LIMIT %s"
+RECENT_SONGS_QUERY = "SELECT Title, releaseDate FROM Songs ORDER BY releaseDate DESC LIMIT %s"
+PLAY_COUNTS_QUERY = """
+    SELECT songId AS song_id, plays_24h, plays_7d
+    FROM SongPlayCounts
+    WHERE plays_7d > 0
+    ORDER BY plays_24h DESC, plays_7d DESC, songId
+    LIMIT %s
+"""
+# Per-song counts for each window; params: the 1h and 24h window starts,
+# refreshedAt, the 7d window start.
+PLAY_WINDOW_COUNTS_QUERY = """
+    SELECT songId,
+           SUM(CASE WHEN playedAt >= %s THEN 1 ELSE 0 END),
+           SUM(CASE WHEN playedAt >= %s THEN 1 ELSE 0 END),
+           COUNT(*),
+           %s
+    FROM PlayEvents
+    WHERE playedAt >= %s
+    GROUP BY songId
+"""
+
+_pool = None
+_pool_lock = threading.Lock()
+
+_fetch_executor = None
+_fetch_lock = threading.Lock()
+
+_search_index = None
+_search_synced_at = 0.0
+_search_built_at = 0.0
+_search_rebuilding = False
+_search_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(backend.connect, ping=backend.ping, **POOL_CONFIG)
+    return _pool
+
+
+def pool_stats():
+    return get_pool().stats()
+
+
+instrument.metrics.gauges("treble_db_pool", pool_stats)
+instrument.metrics.gauges("treble_catalog_cache", cache_stats)
+
+
+def invalidate_catalog():
+    global _search_synced_at
+    invalidate(*CATALOG_TTL)
+    _search_synced_at = 0.0  # next search pulls the new rows into the index
 
 
 def get_db_connection():
+    start = time.perf_counter()
     try:
-        conn = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="MySQL_Abhuday",
-            database="DBMS_Project"
-        )
-        return conn
-    except mysql.connector.Error as err:
+        conn = get_pool().get_connection()
+    except Exception as err:
+        instrument.metrics.record_acquire(time.perf_counter() - start, ok=False)
         print(f"Database connection error: {err}")
         return None
+    acquired = time.perf_counter() - start
+    instrument.metrics.record_acquire(acquired)
+    return instrument.InstrumentedConnection(conn, acquired, backend.explain)
+
+
+def _get_fetch_executor():
+    global _fetch_executor
+    if _fetch_executor is None:
+        with _fetch_lock:
+            if _fetch_executor is None:
+                _fetch_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="treble-fetch")
+    return _fetch_executor
+
+
+def gather(calls):
+    # Runs a page's independent reads at once: {key: fn} -> {key: fn()}, so
+    # the page waits for the slowest query instead of their sum. Each fn
+    # runs in a copy of the caller's context, so instrument's per-rerun
+    # collection still sees its queries. Exceptions are re-raised here.
+    if len(calls) <= 1 or threading.current_thread().name.startswith("treble-fetch"):
+        return {key: fn() for key, fn in calls.items()}
+    executor = _get_fetch_executor()
+    futures = {key: executor.submit(contextvars.copy_context().run, fn) for key, fn in calls.items()}
+    return {key: future.result() for key, future in futures.items()}
 
 
 def hash_password(password):
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode(), salt)
-    return hashed.decode()
+    return auth.hash_password(password)
 
 
 def verify_password(hashed_password, user_password):
-    try:
-        return bcrypt.checkpw(user_password.encode(), hashed_password.encode())
-    except Exception:
-        return hashed_password == hashlib.sha256(user_password.encode()).hexdigest()
+    return auth.verify_password(user_password, hashed_password)
 
 
 def validate_password(password):
@@ -46,27 +205,37 @@ def user_exists(username):
         return False
 
     cur = conn.cursor()
-    cur.execute("SELECT 1 FROM Users WHERE name = %s", (username,))
-    exists = cur.fetchone() is not None
-    cur.close()
-    conn.close()
+    try:
+        cur.execute(USER_EXISTS_QUERY, (username,))
+        exists = cur.fetchone() is not None
+    finally:
+        cur.close()
+        conn.close()
     return exists
 
 
 def signup_user(name, password, sub_type):
+    # Hashed before taking a connection: bcrypt (and its queue) can take
+    # longer than the pool's checkout timeout.
+    try:
+        hashed = hash_password(password)
+    except Exception as e:
+        print(f"Signup error: {e}")
+        return None
+
     conn = get_db_connection()
     if not conn:
-        return False
+        return None
 
     cur = conn.cursor()
     try:
-        cur.execute("INSERT INTO Users (name, password, subscription_type, date_joined) VALUES (%s, %s, %s, CURDATE())",
-                    (name, hash_password(password), sub_type))
+        cur.execute("INSERT INTO Users (name, password, subscription_type, date_joined) VALUES (%s, %s, %s, %s)",
+                    (name, hashed, sub_type, date.today()))
         conn.commit()
-        return True
+        return cur.lastrowid
     except Exception as e:
         print(f"Signup error: {e}")
-        return False
+        return None
     finally:
         cur.close()
         conn.close()
@@ -78,14 +247,68 @@ def login_user(name, password):
         return None
 
     cur = conn.cursor(dictionary=True)
-    cur.execute("SELECT user_id, password FROM Users WHERE name = %s", (name,))
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+    try:
+        cur.execute(LOGIN_USER_QUERY, (name,))
+        row = cur.fetchone()
+    finally:
+        cur.close()
+        conn.close()
 
-    if row and verify_password(row['password'], password):
-        return row['user_id']
-    return None
+    # bcrypt runs with the connection back in the pool, so a burst of logins
+    # queued for the auth pool can't starve every other query.
+    if not row or not verify_password(row['password'], password):
+        return None
+
+    # Upgrade legacy SHA-256 and low-cost bcrypt hashes while we still
+    # have the plain password. The WHERE on the old hash keeps a
+    # concurrent password change from being overwritten.
+    if auth.needs_rehash(row['password']):
+        try:
+            rehashed = hash_password(password)
+        except Exception as e:
+            print(f"Password rehash error: {e}")
+            return row['user_id']
+        conn = get_db_connection()
+        if conn:
+            cur = conn.cursor()
+            try:
+                cur.execute("UPDATE Users SET password = %s WHERE user_id = %s AND password = %s",
+                            (rehashed, row['user_id'], row['password']))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"Password rehash error: {e}")
+            finally:
+                cur.close()
+                conn.close()
+    return row['user_id']
+
+
+@cached("legacy_passwords", LEGACY_PASSWORD_TTL)
+def count_legacy_passwords():
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT COUNT(*) FROM Users WHERE password NOT LIKE '$2%'")
+        return cur.fetchone()[0]
+    except Exception as e:
+        print(f"Error counting legacy passwords: {e}")
+        return None
+    finally:
+        cur.close()
+        conn.close()
+
+
+def user_stats():
+    # Users whose password is still an unsalted SHA-256 hash; it drops as
+    # they sign in and get rehashed.
+    return {"legacy_passwords": count_legacy_passwords()}
+
+
+instrument.metrics.gauges("treble_users", user_stats)
 
 
 def get_user_name(uid):
@@ -94,34 +317,44 @@ def get_user_name(uid):
         return "User"
 
     cur = conn.cursor()
-    cur.execute("SELECT name FROM Users WHERE user_id = %s", (uid,))
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+    try:
+        cur.execute("SELECT name FROM Users WHERE user_id = %s", (uid,))
+        row = cur.fetchone()
+    finally:
+        cur.close()
+        conn.close()
     return row[0] if row else "User"
 
 
 def get_user_profile(uid):
     conn = get_db_connection()
     if not conn:
-        return {"name": "User", "subscription_type": "Unknown", "date_joined": "Unknown"}
+        return None
 
     cur = conn.cursor(dictionary=True)
-    cur.execute("SELECT name, subscription_type, date_joined FROM Users WHERE user_id = %s", (uid,))
-    profile = cur.fetchone()
-    cur.close()
-    conn.close()
+    try:
+        cur.execute("SELECT name, subscription_type, date_joined FROM Users WHERE user_id = %s", (uid,))
+        profile = cur.fetchone()
+    finally:
+        cur.close()
+        conn.close()
     return profile
 
 
 def change_password(uid, new_pass):
+    try:
+        hashed = hash_password(new_pass)
+    except Exception as e:
+        print(f"Password change error: {e}")
+        return False
+
     conn = get_db_connection()
     if not conn:
         return False
 
     cur = conn.cursor()
     try:
-        cur.execute("UPDATE Users SET password = %s WHERE user_id = %s", (hash_password(new_pass), uid))
+        cur.execute("UPDATE Users SET password = %s WHERE user_id = %s", (hashed, uid))
         conn.commit()
         return True
     except Exception as e:
@@ -186,83 +419,311 @@ def delete_user(uid):
 
 
 def get_top_songs(limit=5):
+    # Served from the in-memory leaderboard (O(limit), no SQL) once the
+    # play-count refresh has loaded it; song details come from the search
+    # index, which already holds the catalog.
+    if leaderboard.loaded:
+        entries = leaderboard.top(limit)
+        index = get_search_index() if entries else None
+        if index is not None:
+            songs = []
+            for entry in entries:
+                song = index.get(entry["song_id"])
+                if song:
+                    songs.append(dict(song, **entry))
+            if songs:
+                return songs
+    return _query_top_songs(limit)
+
+
+@cached("top_songs", CATALOG_TTL["top_songs"], default=list)
+def _query_top_songs(limit):
     conn = get_db_connection()
     if not conn:
-        return []
+        return None
 
     cur = conn.cursor(dictionary=True)
     try:
+        # Trending comes from the pre-aggregated play counters (see
+        # refresh_play_counts); GetTopSongs only covers a catalog nobody
+        # has played yet.
+        cur.execute("""
+            SELECT s.song_id, s.Title, s.audioFile, s.thumbnail, s.duration, s.replayGain, c.plays_24h, c.plays_7d
+            FROM SongPlayCounts c
+            JOIN Songs s ON s.song_id = c.songId
+            WHERE c.plays_7d > 0
+            ORDER BY c.plays_24h DESC, c.plays_7d DESC, s.song_id
+            LIMIT %s
+        """, (limit,))
+        result = cur.fetchall()
+        if result:
+            return result
+
         cur.callproc('GetTopSongs', (limit,))  # Call stored procedure
-        result = []
         for res in cur.stored_results():
             result = res.fetchall()
         return result
     except Exception as e:
         print(f"Error fetching top songs: {e}")
-        return []
+        return None
+    finally:
+        cur.close()
+        conn.close()
+
+
+def get_play_counts(limit):
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(PLAY_COUNTS_QUERY, (limit,))
+        return cur.fetchall()
+    except Exception as e:
+        print(f"Error fetching play counts: {e}")
+        return None
     finally:
         cur.close()
         conn.close()
 
 
+def insert_play_events(events):
+    conn = get_db_connection()
+    if not conn:
+        return False
 
+    cur = conn.cursor()
+    try:
+        cur.executemany("INSERT INTO PlayEvents (userId, songId, playedAt) VALUES (%s, %s, %s)", events)
+        conn.commit()
+        return True
+    except Exception as e:
+        print(f"Play event insert error: {e}")
+        return False
+    finally:
+        cur.close()
+        conn.close()
+
+
+# Rolling windows kept in SongPlayCounts, as column -> window length.
+PLAY_WINDOWS = {
+    "plays_1h": timedelta(hours=1),
+    "plays_24h": timedelta(days=1),
+    "plays_7d": timedelta(days=7),
+}
+
+
+def refresh_play_counts():
+    conn = get_db_connection()
+    if not conn:
+        return False
 
+    now = datetime.now().replace(microsecond=0)  # DATETIME columns keep whole seconds
+    cur = conn.cursor()
+    try:
+        # Only the last 7 days of PlayEvents are scanned; readers never touch
+        # raw events.
+        cur.execute("INSERT INTO SongPlayCounts (songId, plays_1h, plays_24h, plays_7d, refreshedAt)"
+                    + PLAY_WINDOW_COUNTS_QUERY
+                    + backend.upsert("songId", ["plays_1h", "plays_24h", "plays_7d", "refreshedAt"]),
+                    (now - PLAY_WINDOWS["plays_1h"], now - PLAY_WINDOWS["plays_24h"], now,
+                     now - PLAY_WINDOWS["plays_7d"]))
+        # Songs that dropped out of every window.
+        cur.execute("""
+            UPDATE SongPlayCounts
+            SET plays_1h = 0, plays_24h = 0, plays_7d = 0, refreshedAt = %s
+            WHERE refreshedAt < %s
+        """, (now, now))
+        conn.commit()
+        invalidate("top_songs")
+        return True
+    except Exception as e:
+        print(f"Play count refresh error: {e}")
+        return False
+    finally:
+        cur.close()
+        conn.close()
+
+
+@cached("recent_songs", CATALOG_TTL["recent_songs"], default=list)
 def get_recent_songs(limit=5):
     conn = get_db_connection()
     if not conn:
-        return []
+        return None
 
     cur = conn.cursor(dictionary=True)
-    cur.execute("SELECT Title, releaseDate FROM Songs ORDER BY releaseDate DESC LIMIT %s", (limit,))
-    data = cur.fetchall()
-    cur.close()
-    conn.close()
+    try:
+        cur.execute(RECENT_SONGS_QUERY, (limit,))
+        data = cur.fetchall()
+    finally:
+        cur.close()
+        conn.close()
     return data
 
 
+@cached("genres", CATALOG_TTL["genres"], default=list)
 def get_all_genres():
     conn = get_db_connection()
     if not conn:
-        return []
+        return None
 
     cur = conn.cursor(dictionary=True)
-    cur.execute("SELECT genreName FROM Genres")
-    genres = cur.fetchall()
-    cur.close()
-    conn.close()
+    try:
+        cur.execute("SELECT genreName FROM Genres")
+        genres = cur.fetchall()
+    finally:
+        cur.close()
+        conn.close()
     return genres
 
 
-def get_songs(search_query=None):
+def _load_search_docs(after_id):
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(SEARCH_DOCS_QUERY, (after_id,))
+        return cur.fetchall()
+    except Exception as e:
+        print(f"Error loading search index: {e}")
+        return None
+    finally:
+        cur.close()
+        conn.close()
+
+
+def _build_search_index():
+    index = SearchIndex()
+    rows = _load_search_docs(index.max_id)
+    if rows is None:
+        return None
+    index.add_many(rows)
+    return index
+
+
+def _rebuild_search_index():
+    # Runs off the request path; searches keep using the old index until the
+    # new one is swapped in.
+    global _search_index, _search_built_at, _search_rebuilding
+    try:
+        index = _build_search_index()
+        if index is None:
+            return
+        with _search_lock:
+            rows = _load_search_docs(index.max_id)
+            if rows:
+                index.add_many(rows)
+            _search_index = index
+            _search_built_at = time.monotonic()
+    finally:
+        _search_rebuilding = False
+
+
+def sync_search_index(full=False):
+    global _search_index, _search_synced_at, _search_built_at, _search_rebuilding
+    with _search_lock:
+        if full or _search_index is None:
+            index = _build_search_index()
+            if index is None:
+                return _search_index
+            _search_index = index
+            _search_synced_at = _search_built_at = time.monotonic()
+            return index
+
+        if not _search_rebuilding and time.monotonic() - _search_built_at > SEARCH_REBUILD_INTERVAL:
+            _search_rebuilding = True
+            threading.Thread(target=_rebuild_search_index, name="treble-search-rebuild", daemon=True).start()
+
+        index = _search_index
+        rows = _load_search_docs(index.max_id)
+        if rows is None:
+            return index
+        index.add_many(rows)
+        _search_synced_at = time.monotonic()
+        return index
+
+
+def get_search_index():
+    if _search_index is None or time.monotonic() - _search_synced_at > SEARCH_SYNC_INTERVAL:
+        return sync_search_index()
+    return _search_index
+
+
+def page_cursor(songs):
+    # Keyset cursor for the page after `songs`: (score, song_id) for ranked
+    # search results, plain song_id for catalog order.
+    if not songs:
+        return None
+    last = songs[-1]
+    return (last["score"], last["song_id"]) if "score" in last else last["song_id"]
+
+
+def _cursor_id(after):
+    return after[1] if isinstance(after, tuple) else after
+
+
+def _ranked_cursor(after):
+    return after if isinstance(after, tuple) or after is None else None
+
+
+def songs_query(search_query=None, after=None, limit=None):
+    # (sql, params) for the Browse grid without the search index.
+    conditions = []
+    params = []
+    if search_query:
+        conditions.append("Title LIKE %s")
+        params.append(f"%{search_query}%")
+    if after is not None:
+        conditions.append("song_id > %s")
+        params.append(_cursor_id(after))
+
+    query = "SELECT song_id, Title, audioFile, thumbnail, duration, replayGain FROM Songs"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY song_id"
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit)
+    return query, tuple(params)
+
+
+def get_songs(search_query=None, after=None, limit=None):
+    if search_query:
+        index = get_search_index()
+        if index is not None:
+            return index.search(search_query, after=_ranked_cursor(after), limit=limit)[0]
+
     conn = get_db_connection()
     if not conn:
         return []
 
     cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(*songs_query(search_query, after, limit))
 
-    if search_query:
-        query = "SELECT song_id, Title, audioFile, thumbnail FROM Songs WHERE Title LIKE %s"
-        cursor.execute(query, (f"%{search_query}%",))
-    else:
-        query = "SELECT song_id, Title, audioFile, thumbnail FROM Songs"
-        cursor.execute(query)
-
-    songs = cursor.fetchall()
-    cursor.close()
-    conn.close()
+        songs = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
     return songs
 
 
+@cached("song_titles", CATALOG_TTL["song_titles"], default=list)
 def get_all_song_titles():
     conn = get_db_connection()
     if not conn:
-        return []
+        return None
 
     cur = conn.cursor(dictionary=True)
-    cur.execute("SELECT song_id, Title FROM Songs")
-    data = cur.fetchall()
-    cur.close()
-    conn.close()
+    try:
+        cur.execute("SELECT song_id, Title FROM Songs")
+        data = cur.fetchall()
+    finally:
+        cur.close()
+        conn.close()
     return data
 
 
@@ -272,23 +733,47 @@ def get_song_id_by_title(title):
         return None
 
     cur = conn.cursor()
-    cur.execute("SELECT song_id FROM Songs WHERE Title = %s", (title,))
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+    try:
+        cur.execute(SONG_ID_BY_TITLE_QUERY, (title,))
+        row = cur.fetchone()
+    finally:
+        cur.close()
+        conn.close()
     return row[0] if row else None
 
 
+def song_exists(song_id):
+    # The search index answers for everything but songs added since its last
+    # sync, so only those cost a query.
+    index = get_search_index()
+    if index is not None and song_id in index:
+        return True
+
+    conn = get_db_connection()
+    if not conn:
+        return False
+
+    cur = conn.cursor()
+    try:
+        cur.execute(SONG_EXISTS_QUERY, (song_id,))
+        return cur.fetchone() is not None
+    finally:
+        cur.close()
+        conn.close()
+
+
 def playlist_exists(user_id, name):
     conn = get_db_connection()
     if not conn:
         return False
 
     cur = conn.cursor()
-    cur.execute("SELECT 1 FROM Playlists WHERE userId = %s AND name = %s", (user_id, name))
-    exists = cur.fetchone() is not None
-    cur.close()
-    conn.close()
+    try:
+        cur.execute(PLAYLIST_EXISTS_QUERY, (user_id, name))
+        exists = cur.fetchone() is not None
+    finally:
+        cur.close()
+        conn.close()
     return exists
 
 
@@ -317,14 +802,7 @@ def get_user_playlists(user_id):
 
     cur = conn.cursor(dictionary=True)
     try:
-        cur.execute("""
-            SELECT 
-                p.playlistId,
-                p.name,
-                (SELECT COUNT(*) FROM PlaylistSongs ps WHERE ps.playlistId = p.playlistId) AS song_count
-            FROM Playlists p
-            WHERE p.userId = %s
-        """, (user_id,))
+        cur.execute(USER_PLAYLISTS_QUERY, (user_id,))
         playlists = cur.fetchall()
         return playlists
     except Exception as e:
@@ -334,6 +812,142 @@ def get_user_playlists(user_id):
         cur.close()
         conn.close()
 
+
+def get_user_playlists_with_songs(user_id):
+    conn = get_db_connection()
+    if not conn:
+        return []
+
+    cur = conn.cursor(dictionary=True)
+    try:
+        # One joined query for every playlist and its songs instead of one
+        # query per playlist.
+        cur.execute(USER_PLAYLISTS_WITH_SONGS_QUERY, (user_id,))
+        playlists = {}
+        for row in cur.fetchall():
+            playlist = playlists.setdefault(row["playlistId"], {
+                "playlistId": row["playlistId"],
+                "name": row["name"],
+                "song_count": 0,
+                "songs": [],
+            })
+            if row["song_id"] is not None:
+                playlist["songs"].append({"song_id": row["song_id"], "Title": row["Title"],
+                                          "audioFile": row["audioFile"], "duration": row["duration"],
+                                          "replayGain": row["replayGain"]})
+                playlist["song_count"] += 1
+        return list(playlists.values())
+    except Exception as e:
+        print(f"Error fetching user playlists: {e}")
+        return []
+    finally:
+        cur.close()
+        conn.close()
+
+
+def get_waveforms(song_ids):
+    # {song_id: peak bytes} for the player; kept out of the catalog queries
+    # and the search index, which don't need 256 bytes per song.
+    if not song_ids:
+        return {}
+    conn = get_db_connection()
+    if not conn:
+        return {}
+
+    placeholders = ", ".join(["%s"] * len(song_ids))
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT song_id, waveform FROM Songs WHERE song_id IN ({placeholders}) AND waveform IS NOT NULL",
+                    tuple(song_ids))
+        return {song_id: bytes(waveform) for song_id, waveform in cur.fetchall()}
+    except Exception as e:
+        print(f"Error fetching waveforms: {e}")
+        return {}
+    finally:
+        cur.close()
+        conn.close()
+
+
+def get_playlist_pairs():
+    # Every (songId, playlistId) in PlaylistSongs, for similar.py.
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT songId, playlistId FROM PlaylistSongs")
+        return cur.fetchall()
+    except Exception as e:
+        print(f"Error loading playlist songs: {e}")
+        return None
+    finally:
+        cur.close()
+        conn.close()
+
+
+def get_song_similarities():
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT songId, similarId, score FROM SongSimilarities ORDER BY songId, score DESC, similarId")
+        return cur.fetchall()
+    except Exception as e:
+        print(f"Error loading song similarities: {e}")
+        return None
+    finally:
+        cur.close()
+        conn.close()
+
+
+def replace_song_similarities(song_ids, rows):
+    # Replaces the stored neighbours of song_ids (all songs if None) with rows
+    # of (songId, similarId, score), in one transaction.
+    conn = get_db_connection()
+    if not conn:
+        return False
+
+    cur = conn.cursor()
+    try:
+        if song_ids is None:
+            cur.execute("DELETE FROM SongSimilarities")
+        else:
+            cur.executemany("DELETE FROM SongSimilarities WHERE songId = %s", [(song_id,) for song_id in song_ids])
+        if rows:
+            cur.executemany("INSERT INTO SongSimilarities (songId, similarId, score) VALUES (%s, %s, %s)", rows)
+        conn.commit()
+        return True
+    except Exception as e:
+        conn.rollback()
+        print(f"Error storing song similarities: {e}")
+        return False
+    finally:
+        cur.close()
+        conn.close()
+
+
+def search_song_titles(prefix, limit=20):
+    conn = get_db_connection()
+    if not conn:
+        return []
+
+    # A prefix pattern (no leading wildcard) can use the index on Title.
+    pattern = prefix.replace("!", "!!").replace("%", "!%").replace("_", "!_") + "%"
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(SONG_TITLE_PREFIX_QUERY, (pattern, limit))
+        return cur.fetchall()
+    except Exception as e:
+        print(f"Error searching song titles: {e}")
+        return []
+    finally:
+        cur.close()
+        conn.close()
+
+
 def add_song_to_playlist(playlist_id, song_id):
     conn = get_db_connection()
     if not conn:
@@ -357,26 +971,37 @@ def add_song_to_playlist(playlist_id, song_id):
         cur.close()
         conn.close()
 
-def search_songs(search_query, genre=None):
+def search_songs_query(search_query, genre=None, after=None, limit=None):
+    # (sql, params) for search without the search index.
+    conditions = ["s.Title LIKE %s"]
+    params = [f"%{search_query}%"]
+    if genre:
+        conditions.append("s.genreId IN (SELECT g.genreId FROM Genres g WHERE g.genreName = %s)")
+        params.append(genre)
+    if after is not None:
+        conditions.append("s.song_id > %s")
+        params.append(_cursor_id(after))
+
+    query = ("SELECT s.song_id, s.Title, s.audioFile, s.thumbnail, s.duration, s.replayGain FROM Songs s WHERE "
+             + " AND ".join(conditions) + " ORDER BY s.song_id")
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit)
+    return query, tuple(params)
+
+
+def search_songs(search_query, genre=None, after=None, limit=None):
+    index = get_search_index()
+    if index is not None:
+        return index.search(search_query, genre=genre, after=_ranked_cursor(after), limit=limit)[0]
+
     conn = get_db_connection()
     if not conn:
         return []
 
     cur = conn.cursor(dictionary=True)
     try:
-        if genre:
-            cur.execute("""
-                SELECT s.song_id, s.Title, s.audioFile, s.thumbnail
-                FROM Songs s
-                WHERE s.Title LIKE %s
-                  AND s.genreId IN (
-                      SELECT g.genreId
-                      FROM Genres g
-                      WHERE g.genreName = %s
-                  )
-            """, (f"%{search_query}%", genre))
-        else:
-            cur.execute("SELECT song_id, Title, audioFile, thumbnail FROM Songs WHERE Title LIKE %s", (f"%{search_query}%",))
+        cur.execute(*search_songs_query(search_query, genre, after, limit))
         songs = cur.fetchall()
         return songs
     except Exception as e:
@@ -386,6 +1011,7 @@ def search_songs(search_query, genre=None):
         cur.close()
         conn.close()
 
+
 def batch_insert_songs(song_data):
     conn = get_db_connection()
     if not conn:
@@ -395,6 +1021,7 @@ def batch_insert_songs(song_data):
     try:
         cur.callproc('BatchInsertSongs', (json.dumps(song_data),))  # Pass JSON data
         conn.commit()
+        invalidate_catalog()
         return True
     except Exception as e:
         print(f"Batch insert error: {e}")
@@ -0,0 +1,289 @@
+import bisect
+import contextvars
+import functools
+import os
+import re
+import sys
+import threading
+import time
+
+# --- Config ---
+SLOW_QUERY_MS = float(os.environ.get("TREBLE_SLOW_QUERY_MS", "200"))
+EXPLAIN_SLOW_QUERIES = os.environ.get("TREBLE_EXPLAIN_SLOW_QUERIES", "1") == "1"
+# Seconds; the same buckets serve query time and connection-acquire time.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=1024)
+def fingerprint(sql):
+    # Literals and placeholders become ?, so every call of one query in
+    # db.py shares a fingerprint whatever its parameters.
+    sql = _STRING_RE.sub("?", sql)
+    sql = sql.replace("%s", "?")
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _IN_LIST_RE.sub("(?+)", sql)
+    return _SPACE_RE.sub(" ", sql).strip()
+
+
+def _caller():
+    # The db.py (or Bulk_Import.py) function that issued the query.
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_code.co_filename == __file__:
+        frame = frame.f_back
+    return frame.f_code.co_name if frame is not None else "?"
+
+
+# --- Metrics ---
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = {}
+        self.rows = {}
+        self.slow = {}
+        self.durations = {}
+        self.acquire = Histogram()
+        self.acquire_failures = 0
+        self._gauges = {}
+
+    def record_query(self, function, seconds, slow):
+        with self._lock:
+            self.queries[function] = self.queries.get(function, 0) + 1
+            if slow:
+                self.slow[function] = self.slow.get(function, 0) + 1
+            self.durations.setdefault(function, Histogram()).observe(seconds)
+
+    def record_rows(self, function, rows):
+        with self._lock:
+            self.rows[function] = self.rows.get(function, 0) + rows
+
+    def record_acquire(self, seconds, ok=True):
+        with self._lock:
+            self.acquire.observe(seconds)
+            if not ok:
+                self.acquire_failures += 1
+
+    def gauges(self, prefix, source):
+        # source() -> {name: number}, read at scrape time.
+        self._gauges[prefix] = source
+
+    def render(self):
+        lines = []
+
+        def counter(name, help_text, values):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for function, value in sorted(values.items()):
+                lines.append(f'{name}{{function="{function}"}} {value}')
+
+        def histogram(name, hist, labels=""):
+            cumulative = 0
+            for bound, count in zip(hist.buckets, hist.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels}le="+Inf"}} {hist.count}')
+            lines.append(f"{name}_sum{{{labels.rstrip(',')}}} {hist.sum:.6f}")
+            lines.append(f"{name}_count{{{labels.rstrip(',')}}} {hist.count}")
+
+        with self._lock:
+            counter("treble_db_queries_total", "Queries executed, by db.py function.", self.queries)
+            counter("treble_db_rows_total", "Rows returned or affected, by db.py function.", self.rows)
+            counter("treble_db_slow_queries_total", f"Queries slower than {SLOW_QUERY_MS:g} ms.", self.slow)
+            lines.append("# HELP treble_db_query_duration_seconds Query execution time, by db.py function.")
+            lines.append("# TYPE treble_db_query_duration_seconds histogram")
+            for function, hist in sorted(self.durations.items()):
+                histogram("treble_db_query_duration_seconds", hist, f'function="{function}",')
+            lines.append("# HELP treble_db_connection_acquire_seconds Time to get a connection from the pool.")
+            lines.append("# TYPE treble_db_connection_acquire_seconds histogram")
+            histogram("treble_db_connection_acquire_seconds", self.acquire)
+            lines.append("# TYPE treble_db_connection_acquire_failures_total counter")
+            lines.append(f"treble_db_connection_acquire_failures_total {self.acquire_failures}")
+            sources = list(self._gauges.items())
+
+        for prefix, source in sources:
+            try:
+                values = source()
+            except Exception:
+                continue
+            for name, value in sorted(values.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"# TYPE {prefix}_{name} gauge")
+                    lines.append(f"{prefix}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+# --- Per-rerun collection ---
+_collector = contextvars.ContextVar("treble_queries", default=None)
+
+
+def start_collecting():
+    # Every query issued afterwards in this context (one Streamlit rerun)
+    # is appended to the returned list.
+    queries = []
+    _collector.set(queries)
+    return queries
+
+
+def summarize(queries):
+    by_function = {}
+    for q in queries:
+        entry = by_function.setdefault(q["function"], {"function": q["function"], "queries": 0,
+                                                       "ms": 0.0, "rows": 0, "acquire_ms": 0.0})
+        entry["queries"] += 1
+        entry["ms"] += q["ms"]
+        entry["rows"] += q["rows"]
+        entry["acquire_ms"] += q["acquire_ms"]
+    return sorted(by_function.values(), key=lambda entry: -entry["ms"])
+
+
+# --- Wrappers ---
+class InstrumentedCursor:
+    def __init__(self, cur, conn):
+        self._cur = cur
+        self._conn = conn
+        self._record = None
+        self._params = None
+
+    def _start(self, sql, params):
+        self._finish()
+        self._params = params
+        self._record = {"function": _caller(), "sql": fingerprint(sql), "raw_sql": sql,
+                        "ms": 0.0, "rows": 0, "acquire_ms": self._conn.take_acquire_ms()}
+        return time.perf_counter()
+
+    def _end(self, start):
+        record = self._record
+        seconds = time.perf_counter() - start
+        record["ms"] = seconds * 1000
+        record["slow"] = record["ms"] >= SLOW_QUERY_MS
+        metrics.record_query(record["function"], seconds, record["slow"])
+        if self._cur.description is None and self._cur.rowcount and self._cur.rowcount > 0:
+            self._add_rows(self._cur.rowcount)
+        queries = _collector.get()
+        if queries is not None:
+            queries.append(record)
+
+    def _add_rows(self, n):
+        if self._record is not None and n:
+            self._record["rows"] += n
+            metrics.record_rows(self._record["function"], n)
+
+    def _finish(self):
+        # Slow queries are explained once their results have been read, so
+        # the EXPLAIN doesn't collide with an unread result set.
+        record, self._record = self._record, None
+        if record is None or not record.get("slow"):
+            return
+        print(f"🐢 Slow query in {record['function']} ({record['ms']:.0f} ms, {record['rows']} rows): {record['sql']}")
+        if EXPLAIN_SLOW_QUERIES and record["raw_sql"].lstrip()[:6].upper() == "SELECT":
+            try:
+                for row in self._conn.explain(record["raw_sql"], self._params):
+                    print(f"    {row}")
+            except Exception as e:
+                print(f"    (EXPLAIN failed: {e})")
+
+    def execute(self, sql, params=None):
+        start = self._start(sql, params)
+        try:
+            return self._cur.execute(sql, params) if params is not None else self._cur.execute(sql)
+        finally:
+            self._end(start)
+
+    def executemany(self, sql, seq_params):
+        start = self._start(sql, None)
+        try:
+            return self._cur.executemany(sql, seq_params)
+        finally:
+            self._end(start)
+
+    def callproc(self, name, args=()):
+        start = self._start(f"CALL {name}", None)
+        try:
+            return self._cur.callproc(name, args)
+        finally:
+            self._end(start)
+
+    def stored_results(self):
+        for result in self._cur.stored_results():
+            rows = result.fetchall()
+            self._add_rows(len(rows))
+            yield _Rows(rows)
+
+    def fetchone(self):
+        row = self._cur.fetchone()
+        if row is not None:
+            self._add_rows(1)
+        return row
+
+    def fetchall(self):
+        rows = self._cur.fetchall()
+        self._add_rows(len(rows))
+        return rows
+
+    def close(self):
+        self._finish()
+        self._cur.close()
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+
+class _Rows:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def fetchall(self):
+        return self._rows
+
+
+class InstrumentedConnection:
+    def __init__(self, conn, acquire_seconds, explain):
+        self._conn = conn
+        self._acquire_ms = acquire_seconds * 1000
+        self._explain = explain
+
+    def take_acquire_ms(self):
+        # Charged to the first query run on this checkout.
+        ms, self._acquire_ms = self._acquire_ms, 0.0
+        return ms
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs), self)
+
+    def explain(self, sql, params):
+        return self._explain(self._conn, sql, params)
+
+    def close(self):
+        self._conn.close()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,12 +1,27 @@
 import streamlit as st
 import os
+import artwork
+import auth
 import db
+import instrument
+import player
+import plays
+import similar
+import stream_server
+import transcode
 import qrcode
+import time
 from io import BytesIO
+from datetime import date
 
 AUDIO_DIR = os.path.join(os.getcwd(), "songs")
 COVER_DIR = os.path.join(os.getcwd(), "covers")
+DEBUG_PANEL = os.environ.get("TREBLE_DEBUG", "") == "1"
 st.set_page_config(page_title="Treble", layout="wide")
+stream_server.ensure_started()
+plays.get_buffer()  # starts the play-event flush/aggregation thread
+similar.get_refresher()  # starts the similar-songs refresh thread
+rerun_queries = instrument.start_collecting()
 
 # Theme setup
 if "theme" not in st.session_state:
@@ -86,15 +101,66 @@ apply_theme(theme)
 if "user_id" not in st.session_state:
     st.session_state["user_id"] = None
 
+UNKNOWN_PROFILE = {"name": "User", "subscription_type": "Unknown", "date_joined": "Unknown"}
+
+
+# The signed-in user's profile lives in the session and is only re-read from
+# the DB at login; profile changes made here are written through to it.
+def start_session(user_id, profile=None):
+    st.session_state["user_id"] = user_id
+    st.session_state["user"] = profile or db.get_user_profile(user_id)
+
+
+def end_session():
+    st.session_state["user_id"] = None
+    st.session_state["user"] = None
+    st.session_state["stream_token"] = None
+
+
+def stream_token():
+    # Signs this session's stream URLs with the user's tier. Re-issued when
+    # the subscription changes and once half its lifetime is gone, so a
+    # queue started now outlives the rest of it.
+    token = st.session_state.get("stream_token")
+    claims = stream_server.check_token(token)
+    tier = transcode.tier_for(current_user()["subscription_type"])
+    if (claims is None or claims["user_id"] != st.session_state["user_id"] or claims["tier"] != tier
+            or claims["expires"] - time.time() < stream_server.STREAM_TOKEN_TTL / 2):
+        token = stream_server.session_token(st.session_state["user_id"], tier)
+        st.session_state["stream_token"] = token
+    return token
+
+
+def current_user():
+    user = st.session_state.get("user")
+    if user is None:
+        user = db.get_user_profile(st.session_state["user_id"])
+        if user is None:
+            return UNKNOWN_PROFILE
+        st.session_state["user"] = user
+    return user
+
+
+def set_subscription(subscription_type):
+    if db.update_subscription(st.session_state["user_id"], subscription_type):
+        if st.session_state.get("user"):
+            st.session_state["user"]["subscription_type"] = subscription_type
+        return True
+    return False
+
 
 def login():
     st.title("🔐 Login")
     name = st.text_input("Username")
     password = st.text_input("Password", type="password")
     if st.button("Login"):
-        user_id = db.login_user(name, password)
+        try:
+            user_id = db.login_user(name, password)
+        except auth.AuthBusy:
+            st.warning("⏳ Too many logins right now, please try again in a moment.")
+            return
         if user_id:
-            st.session_state["user_id"] = user_id
+            start_session(user_id)
             st.success("✅ Login Successful!")
             st.rerun()
         else:
@@ -113,15 +179,63 @@ def signup():
         elif not db.validate_password(password):
             st.error("❌ Password must be 8+ characters with at least one number and special character.")
         else:
-            if db.signup_user(name, password, subscription_type):
-                user_id = db.login_user(name, password)
-                st.session_state["user_id"] = user_id
+            user_id = db.signup_user(name, password, subscription_type)
+            if user_id:
+                start_session(user_id, {"name": name, "subscription_type": subscription_type,
+                                        "date_joined": date.today()})
                 st.success("✅ Signed up and logged in successfully!")
                 st.rerun()
             else:
                 st.error("❌ Sign Up Failed. Try again.")
 
 
+BROWSE_PAGE_SIZE = 24
+BROWSE_MAX_PAGES = 3  # pages kept on screen by "Load more" before the oldest is dropped
+
+
+def format_duration(seconds):
+    # "3:07", "1:02:45"; empty until the song has been analysed.
+    if seconds is None:
+        return ""
+    minutes, secs = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+
+def play_songs(songs, song_id):
+    # Button callback: runs before the rerun, so the sidebar player
+    # already has the new queue when it is drawn. Plays are recorded by the
+    # player itself, through the stream server's /played beacon, for this
+    # track and every one it moves on to.
+    player.play(songs, song_id, token=stream_token(),
+                waveforms=db.get_waveforms([entry["song_id"] for entry in player.playable(songs)]))
+
+
+def add_to_playlist(playlist_id, song_id):
+    if db.add_song_to_playlist(playlist_id, song_id):
+        similar.playlist_changed()
+        st.toast("✅ Song Added to Playlist!")
+    else:
+        st.toast("❌ Failed to Add Song")
+
+
+def browse_prev():
+    st.session_state.browse_page -= 1
+    st.session_state.browse_loaded = 1
+
+
+def browse_next():
+    st.session_state.browse_page += st.session_state.browse_loaded
+    st.session_state.browse_loaded = 1
+
+
+def browse_load_more():
+    if st.session_state.browse_loaded < BROWSE_MAX_PAGES:
+        st.session_state.browse_loaded += 1
+    else:
+        st.session_state.browse_page += 1
+
+
 # MAIN APP
 if st.session_state["user_id"] is None:
     st.radio("Select an option", ["Login", "Sign Up"], key="auth_mode")
@@ -133,14 +247,24 @@ if st.session_state["user_id"] is None:
 else:
     st.sidebar.title("🎶 Treble")
     page = st.sidebar.radio("Go to", ["Home", "Browse", "Playlists", "Profile", "Logout"])
+    with st.sidebar:
+        player.render()
 
     if page == "Home":
         st.title("🎧 Welcome to Treble")
-        user_name = db.get_user_name(st.session_state["user_id"])
+        user_name = current_user()["name"]
         st.markdown(f"## Hello, **{user_name}** 👋")
 
+        # The three sections' queries run concurrently
+        home = db.gather({
+            "trending": lambda: db.get_top_songs(limit=12),  # Fetch enough songs for multiple rows
+            "recent": lambda: db.get_recent_songs(limit=5),
+            "genres": db.get_all_genres,
+        })
+
         st.subheader("🔥 Trending Songs")
-        trending = db.get_top_songs(limit=12)  # Fetch enough songs for multiple rows
+        trending = home["trending"]
+        trending_playable = {song["song_id"] for song in player.playable(trending)}
 
         # Display songs in a grid (3 songs per row)
         cols_per_row = 3
@@ -151,49 +275,67 @@ else:
             for col, song in zip(cols, row):
                 with col:
                     st.markdown(f"**{song['Title']}**")
+                    if song.get("duration"):
+                        st.caption(f"⏱️ {format_duration(song['duration'])}")
 
                     # Display thumbnail
                     thumbnail = song.get("thumbnail")
                     if thumbnail:
                         thumbnail_path = os.path.join("covers", thumbnail)
                         if os.path.exists(thumbnail_path):
-                            st.image(thumbnail_path, width=150)
+                            st.image(artwork.thumbnail_path(thumbnail_path), width=150)
                         else:
-                            st.image("https://via.placeholder.com/150x150.png?text=No+Cover", width=150)
+                            st.image(artwork.placeholder_cover(song["Title"]), width=150)
                     else:
-                        st.image("https://via.placeholder.com/150x150.png?text=No+Cover", width=150)
-
-                    # Add audio playback
-                    audio_file = song.get("audioFile")
-                    if audio_file:
-                        audio_path = os.path.join("songs", audio_file)
-                        if os.path.exists(audio_path):
-                            with open(audio_path, "rb") as f:
-                                audio_bytes = f.read()
-                                st.audio(audio_bytes, format="audio/mp3")
-                        else:
-                            st.warning("Audio file not found.")
+                        st.image(artwork.placeholder_cover(song["Title"]), width=150)
+
+                    # Plays through the sidebar player, queued with the rest of Trending
+                    if song["song_id"] in trending_playable:
+                        st.button("▶️ Play", key=f"trending_{song['song_id']}",
+                                  on_click=play_songs, args=(trending, song["song_id"]))
+                    elif song.get("audioFile"):
+                        st.warning("Audio file not found.")
                     else:
                         st.info("No audio file available for this song.")
 
         st.subheader("🆕 New Releases")
-        recent = db.get_recent_songs(limit=5)
+        recent = home["recent"]
         for song in recent:
             st.markdown(f"🗓️ {song['Title']} — Released on {song['releaseDate']}")
 
         st.subheader("🎶 Genres")
-        genres = db.get_all_genres()
+        genres = home["genres"]
         st.write(", ".join([g['genreName'] for g in genres]))
 
     elif page == "Browse":
         st.title("🎼 Browse Music")
 
-        if "selected_song_id" not in st.session_state:
-            st.session_state.selected_song_id = None
-
         search_query = st.text_input("🔎 Search for a song")
 
-        songs = db.get_songs(search_query)
+        # Keyset pagination: browse_starts[i] is the cursor page i starts after.
+        if st.session_state.get("browse_query") != search_query:
+            st.session_state.browse_query = search_query
+            st.session_state.browse_starts = [None]
+            st.session_state.browse_page = 0
+            st.session_state.browse_loaded = 1
+
+        first_page = st.session_state.browse_page
+        loaded = st.session_state.browse_loaded
+        starts = st.session_state.browse_starts
+        shown = BROWSE_PAGE_SIZE * loaded
+
+        # One extra row tells us whether there is anything after this window.
+        songs = db.get_songs(search_query, after=starts[first_page], limit=shown + 1)
+        has_more = len(songs) > shown
+        for k in range(1, loaded + 1):
+            if len(songs) > k * BROWSE_PAGE_SIZE:
+                cursor = db.page_cursor(songs[k * BROWSE_PAGE_SIZE - 1:k * BROWSE_PAGE_SIZE])
+                if first_page + k == len(starts):
+                    starts.append(cursor)
+                else:
+                    starts[first_page + k] = cursor
+        songs = songs[:shown]
+        songs_playable = {song["song_id"] for song in player.playable(songs)}
 
         if not songs:
             st.info("No songs found.")
@@ -206,27 +348,40 @@ else:
                 for col, song in zip(cols, row):
                     song_id = song["song_id"]
                     title = song["Title"]
-                    audio_file = song.get("audioFile")
                     thumbnail = song.get("thumbnail")
-                    audio_path = os.path.join("songs", audio_file) if audio_file else None
                     thumbnail_path = os.path.join("covers", thumbnail) if thumbnail else None
 
                     with col:
-                        if st.button(f"▶️ {title}", key=f"play_{song_id}"):
-                            st.session_state.selected_song_id = song_id
+                        # Queues everything on screen, starting here
+                        st.button(f"▶️ {title}", key=f"play_{song_id}", on_click=play_songs, args=(songs, song_id),
+                                  disabled=song_id not in songs_playable,
+                                  help=None if song_id in songs_playable else "Audio file not found.")
+                        if song.get("duration"):
+                            st.caption(f"⏱️ {format_duration(song['duration'])}")
+
+                        # Precomputed neighbours: a dict lookup, no query
+                        neighbours = similar.similar_songs(song_id)
+                        if neighbours:
+                            with st.expander("Similar"):
+                                for other in neighbours:
+                                    st.button(f"▶️ {other['Title']}", key=f"similar_{song_id}_{other['song_id']}",
+                                              on_click=play_songs, args=(neighbours, other["song_id"]))
 
                         if thumbnail_path and os.path.exists(thumbnail_path):
-                            st.image(thumbnail_path, width=150)
+                            st.image(artwork.thumbnail_path(thumbnail_path), width=150)
                         else:
-                            st.image("https://via.placeholder.com/150x150.png?text=No+Cover", width=150)
-
-                        if st.session_state.selected_song_id == song_id:
-                            if audio_path and os.path.exists(audio_path):
-                                with open(audio_path, "rb") as f:
-                                    audio_bytes = f.read()
-                                    st.audio(audio_bytes, format="audio/mp3")
-                            else:
-                                st.warning("Audio file not found.")
+                            st.image(artwork.placeholder_cover(title), width=150)
+
+            nav_prev, nav_info, nav_more, nav_next = st.columns([1, 2, 1, 1])
+            with nav_prev:
+                st.button("⬅️ Previous", on_click=browse_prev, disabled=first_page == 0)
+            with nav_info:
+                last_page = first_page + loaded
+                st.caption(f"Page {first_page + 1}" if loaded == 1 else f"Pages {first_page + 1}–{last_page}")
+            with nav_more:
+                st.button("⬇️ Load more", on_click=browse_load_more, disabled=not has_more)
+            with nav_next:
+                st.button("Next ➡️", on_click=browse_next, disabled=not has_more)
 
     elif page == "Playlists":
         st.title("📂 Your Playlists")
@@ -246,31 +401,64 @@ else:
                     st.error("❌ Failed to Create Playlist")
 
         # Display user's playlists
-        user_playlists = db.get_user_playlists(st.session_state["user_id"])
+        user_playlists = db.get_user_playlists_with_songs(st.session_state["user_id"])
+        # Every search box with text re-runs its search on each rerun; run
+        # them together. The boxes below read the same session-state keys.
+        prefixes = {playlist["playlistId"]: st.session_state.get(f"search_{playlist['playlistId']}", "").strip()
+                    for playlist in user_playlists}
+        title_matches = db.gather({playlist_id: lambda prefix=prefix: db.search_song_titles(prefix)
+                                   for playlist_id, prefix in prefixes.items() if prefix})
         if user_playlists:
-            all_songs = db.get_all_song_titles()
-            song_titles = [song['Title'] for song in all_songs]
-
             for playlist in user_playlists:
-                st.subheader(playlist["name"])
-                selected_song = st.selectbox(
-                    f"Search & Add Song to '{playlist['name']}'",
-                    song_titles,
-                    key=f"select_{playlist['playlistId']}"
-                )
-
-                if st.button(f"Add '{selected_song}' to {playlist['name']}", key=f"add_{playlist['playlistId']}"):
-                    song_id = db.get_song_id_by_title(selected_song)
-                    if song_id and db.add_song_to_playlist(playlist["playlistId"], song_id):
-                        st.success("✅ Song Added to Playlist!")
+                playlist_id = playlist["playlistId"]
+                total = sum(song["duration"] or 0 for song in playlist["songs"])
+                length = f", {format_duration(total)}" if total else ""
+                st.subheader(f"{playlist['name']} ({playlist['song_count']} songs{length})")
+                if playlist["songs"]:
+                    st.button("▶️ Play", key=f"play_playlist_{playlist_id}",
+                              on_click=play_songs, args=(playlist["songs"], None))
+                    with st.expander("Songs"):
+                        for song in playlist["songs"]:
+                            duration = format_duration(song["duration"])
+                            st.markdown(f"- {song['Title']}" + (f" · {duration}" if duration else ""))
+
+                    suggestions = similar.recommend_for([song["song_id"] for song in playlist["songs"]])
+                    if suggestions:
+                        with st.expander("Similar songs"):
+                            for song in suggestions:
+                                title_col, add_col = st.columns([4, 1])
+                                title_col.markdown(song["Title"])
+                                add_col.button("➕", key=f"suggest_{playlist_id}_{song['song_id']}",
+                                               help=f"Add to {playlist['name']}",
+                                               on_click=add_to_playlist, args=(playlist_id, song["song_id"]))
+
+                song_prefix = st.text_input(f"Search & Add Song to '{playlist['name']}'",
+                                            key=f"search_{playlist_id}",
+                                            placeholder="Start typing a song title")
+                if song_prefix.strip():
+                    matches = title_matches[playlist_id]
+                    if matches:
+                        selected_song = st.selectbox(
+                            "Matching songs",
+                            matches,
+                            format_func=lambda song: song["Title"],
+                            key=f"select_{playlist_id}"
+                        )
+
+                        if st.button(f"Add '{selected_song['Title']}' to {playlist['name']}", key=f"add_{playlist_id}"):
+                            if db.add_song_to_playlist(playlist_id, selected_song["song_id"]):
+                                similar.playlist_changed()
+                                st.success("✅ Song Added to Playlist!")
+                            else:
+                                st.error("❌ Failed to Add Song")
                     else:
-                        st.error("❌ Failed to Add Song")
+                        st.info("No songs start with that.")
         else:
             st.info("You have no playlists. Create one above.")
 
     elif page == "Profile":
         st.title("👤 Profile Settings")
-        info = db.get_user_profile(st.session_state["user_id"])
+        info = current_user()
         st.write(f"**Username**: {info['name']}")
         st.write(f"**Subscription**: {info['subscription_type']}")
         st.write(f"**Joined**: {info['date_joined']}")
@@ -281,7 +469,7 @@ else:
         if info['subscription_type'] == "Premium":
             st.success("You are currently on a Premium subscription!")
             if st.button("Cancel Premium"):
-                if db.update_subscription(st.session_state["user_id"], "Free"):
+                if set_subscription("Free"):
                     st.success("Subscription downgraded to Free.")
                     st.rerun()
                 else:
@@ -331,7 +519,7 @@ else:
 
                 if st.button("Confirm Payment"):
                     if payment_id.strip():
-                        if db.update_subscription(st.session_state["user_id"], "Premium"):
+                        if set_subscription("Premium"):
                             st.success("Payment verified! Subscription upgraded to Premium.")
                             st.session_state["show_payment"] = False
                             st.rerun()
@@ -359,15 +547,29 @@ else:
             confirm = st.button("Yes, Delete My Account")
             if confirm:
                 if db.delete_user(st.session_state["user_id"]):
+                    similar.playlist_changed()  # their playlists are gone
                     st.success("Account deleted successfully.")
-                    st.session_state["user_id"] = None
+                    end_session()
                     st.rerun()
                 else:
                     st.error("Failed to delete account.")
 
     elif page == "Logout":
         if st.button("Confirm Logout"):
-            st.session_state["user_id"] = None
+            end_session()
             st.rerun()
         else:
             st.warning("Are you sure you want to logout?")
+
+# Debug panel: the queries this rerun sent to the database.
+if DEBUG_PANEL:
+    with st.sidebar.expander(f"🛠️ {len(rerun_queries)} queries this rerun"):
+        st.caption(f"{sum(q['ms'] for q in rerun_queries):.1f} ms in queries, "
+                   f"{sum(q['acquire_ms'] for q in rerun_queries):.1f} ms waiting for connections")
+        summary = instrument.summarize(rerun_queries)
+        if summary:
+            st.table([{**entry, "ms": round(entry["ms"], 2), "acquire_ms": round(entry["acquire_ms"], 2)}
+                      for entry in summary])
+        for q in rerun_queries:
+            if q["slow"]:
+                st.warning(f"🐢 {q['function']}: {q['ms']:.0f} ms\n\n`{q['sql']}`")
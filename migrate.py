@@ -0,0 +1,156 @@
+import argparse
+import importlib.util
+import os
+import sys
+from datetime import datetime
+
+import db
+from db import backend, get_db_connection
+
+# --- Config ---
+# Each backend has its own migration history: MySQL files in migrations/,
+# SQLite ones in migrations/sqlite/.
+MIGRATIONS_DIR = backend.migrations_dir
+
+# The queries db.py runs on every page view, with representative parameters.
+# The SQL is db.py's own, so the check can't drift from what the app runs.
+# --check fails if any of them has to scan a whole table.
+_SINCE = datetime(2000, 1, 1)
+HOT_QUERIES = {
+    "user_exists": (db.USER_EXISTS_QUERY, ("alice",)),
+    "login_user": (db.LOGIN_USER_QUERY, ("alice",)),
+    "playlist_exists": (db.PLAYLIST_EXISTS_QUERY, (1, "Favourites")),
+    "get_user_playlists": (db.USER_PLAYLISTS_QUERY, (1,)),
+    "get_user_playlists_with_songs": (db.USER_PLAYLISTS_WITH_SONGS_QUERY, (1,)),
+    "get_song_id_by_title": (db.SONG_ID_BY_TITLE_QUERY, ("Intro",)),
+    "song_exists": (db.SONG_EXISTS_QUERY, (1,)),
+    "search_song_titles": (db.SONG_TITLE_PREFIX_QUERY, ("Int%", 20)),
+    "get_recent_songs": (db.RECENT_SONGS_QUERY, (5,)),
+    "get_songs_page": db.songs_query(after=0, limit=24),
+    "search_songs_genre": db.search_songs_query("love", genre="Pop", limit=24),
+    "search_index_sync": (db.SEARCH_DOCS_QUERY, (0,)),
+    "get_play_counts": (db.PLAY_COUNTS_QUERY, (100,)),
+    "refresh_play_counts": (db.PLAY_WINDOW_COUNTS_QUERY, (_SINCE, _SINCE, _SINCE, _SINCE)),
+}
+
+
+def migration_files(directory=MIGRATIONS_DIR):
+    return sorted(name for name in os.listdir(directory)
+                  if name.endswith((".sql", ".py")) and name[:1].isdigit())
+
+
+def split_sql(text):
+    # Understands the mysql client's DELIMITER command so procedure bodies
+    # can be written exactly as they would be pasted into the shell.
+    statements, lines, delimiter = [], [], ";"
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not lines and (not stripped or stripped.startswith("--")):
+            continue
+        if stripped.upper().startswith("DELIMITER "):
+            delimiter = stripped.split(None, 1)[1]
+            continue
+        if stripped.endswith(delimiter):
+            lines.append(line.rstrip()[:-len(delimiter)])
+            statement = "\n".join(lines).strip()
+            if statement:
+                statements.append(statement)
+            lines = []
+        else:
+            lines.append(line)
+    if "\n".join(lines).strip():
+        statements.append("\n".join(lines).strip())
+    return statements
+
+
+def load_upgrade(path):
+    spec = importlib.util.spec_from_file_location(f"migration_{os.path.basename(path)[:-3]}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.upgrade
+
+
+def ensure_version_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(255) PRIMARY KEY,
+            applied_at DATETIME NOT NULL
+        )
+    """)
+
+
+def applied_versions(cur):
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+
+def apply_migration(cur, path):
+    if path.endswith(".sql"):
+        with open(path, encoding="utf-8") as f:
+            for statement in split_sql(f.read()):
+                cur.execute(statement)
+    else:
+        load_upgrade(path)(cur)
+
+
+def migrate(directory=MIGRATIONS_DIR, status_only=False):
+    conn = get_db_connection()
+    if not conn:
+        return False
+    cur = conn.cursor()
+    try:
+        ensure_version_table(cur)
+        done = applied_versions(cur)
+        pending = [name for name in migration_files(directory) if name not in done]
+        if status_only:
+            for name in migration_files(directory):
+                print(f"{'applied' if name in done else 'pending'}  {name}")
+            return True
+        for name in pending:
+            print(f"Applying {name}...")
+            # MySQL commits DDL implicitly, so a migration that fails halfway
+            # is not rolled back; each one is written to be safe to re-run.
+            apply_migration(cur, os.path.join(directory, name))
+            cur.execute("INSERT INTO schema_migrations (version, applied_at) VALUES (%s, %s)",
+                        (name, datetime.now().replace(microsecond=0)))
+            conn.commit()
+        print(f"✅ {len(pending)} migration(s) applied." if pending else "✅ Schema is up to date.")
+        return True
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        return False
+    finally:
+        cur.close()
+        conn.close()
+
+
+def check_hot_queries(queries=HOT_QUERIES):
+    conn = get_db_connection()
+    if not conn:
+        return False
+    ok = True
+    try:
+        for name, (sql, params) in queries.items():
+            scans = backend.full_scans(conn, sql, params)
+            if scans:
+                ok = False
+                print(f"❌ {name}: full scan of {', '.join(scans)}")
+            else:
+                print(f"✅ {name}")
+        return ok
+    except Exception as e:
+        print(f"❌ EXPLAIN failed: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations")
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    parser.add_argument("--check", action="store_true",
+                        help="EXPLAIN the hot queries and exit 1 if any scans a whole table")
+    args = parser.parse_args()
+    if args.check:
+        sys.exit(0 if check_hot_queries() else 1)
+    sys.exit(0 if migrate(status_only=args.status) else 1)
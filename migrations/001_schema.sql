@@ -0,0 +1,71 @@
+-- Base schema. IF NOT EXISTS so this can be adopted by databases that were
+-- created by hand before migrations existed.
+
+CREATE TABLE IF NOT EXISTS Users (
+    user_id INT AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    password VARCHAR(255) NOT NULL,
+    subscription_type VARCHAR(20) NOT NULL DEFAULT 'Free',
+    date_joined DATE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS Artists (
+    artistId INT AUTO_INCREMENT PRIMARY KEY,
+    artistName VARCHAR(255) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS Albums (
+    albumId INT AUTO_INCREMENT PRIMARY KEY,
+    albumName VARCHAR(255) NOT NULL,
+    artistId INT NULL,
+    FOREIGN KEY (artistId) REFERENCES Artists (artistId)
+);
+
+CREATE TABLE IF NOT EXISTS Genres (
+    genreId INT AUTO_INCREMENT PRIMARY KEY,
+    genreName VARCHAR(100) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS Songs (
+    song_id INT AUTO_INCREMENT PRIMARY KEY,
+    Title VARCHAR(255) NOT NULL,
+    artistId INT NULL,
+    albumId INT NULL,
+    genreId INT NULL,
+    releaseDate DATE NULL,
+    audioFile VARCHAR(512) NULL,
+    thumbnail VARCHAR(512) NULL,
+    FOREIGN KEY (artistId) REFERENCES Artists (artistId),
+    FOREIGN KEY (albumId) REFERENCES Albums (albumId),
+    FOREIGN KEY (genreId) REFERENCES Genres (genreId)
+);
+
+CREATE TABLE IF NOT EXISTS Playlists (
+    playlistId INT AUTO_INCREMENT PRIMARY KEY,
+    userId INT NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    FOREIGN KEY (userId) REFERENCES Users (user_id)
+);
+
+CREATE TABLE IF NOT EXISTS PlaylistSongs (
+    playlistId INT NOT NULL,
+    songId INT NOT NULL,
+    PRIMARY KEY (playlistId, songId),
+    FOREIGN KEY (playlistId) REFERENCES Playlists (playlistId),
+    FOREIGN KEY (songId) REFERENCES Songs (song_id)
+);
+
+CREATE TABLE IF NOT EXISTS PlayEvents (
+    eventId BIGINT AUTO_INCREMENT PRIMARY KEY,
+    userId INT NULL,
+    songId INT NOT NULL,
+    playedAt DATETIME NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS SongPlayCounts (
+    songId INT PRIMARY KEY,
+    plays_1h INT NOT NULL DEFAULT 0,
+    plays_24h INT NOT NULL DEFAULT 0,
+    plays_7d INT NOT NULL DEFAULT 0,
+    refreshedAt DATETIME NOT NULL
+);
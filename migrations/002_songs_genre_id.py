@@ -0,0 +1,15 @@
+# Bulk_Import used to write Songs.genre while search reads Songs.genreId.
+# Databases created from the old import script have the former; rename it.
+
+
+def column_exists(cur, table, column):
+    cur.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    """, (table, column))
+    return cur.fetchone() is not None
+
+
+def upgrade(cur):
+    if column_exists(cur, "Songs", "genre") and not column_exists(cur, "Songs", "genreId"):
+        cur.execute("ALTER TABLE Songs CHANGE COLUMN genre genreId INT NULL")
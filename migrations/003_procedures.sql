@@ -0,0 +1,39 @@
+-- Stored procedures called from db.py.
+
+DROP PROCEDURE IF EXISTS GetTopSongs;
+
+DELIMITER $$
+-- Fallback ranking for get_top_songs before any plays are recorded:
+-- songs that appear in the most playlists.
+CREATE PROCEDURE GetTopSongs(IN p_limit INT)
+BEGIN
+    SELECT s.song_id, s.Title, s.audioFile, s.thumbnail, COUNT(ps.songId) AS playlist_count
+    FROM Songs s
+    LEFT JOIN PlaylistSongs ps ON ps.songId = s.song_id
+    GROUP BY s.song_id, s.Title, s.audioFile, s.thumbnail
+    ORDER BY playlist_count DESC, s.song_id
+    LIMIT p_limit;
+END $$
+DELIMITER ;
+
+DROP PROCEDURE IF EXISTS BatchInsertSongs;
+
+DELIMITER $$
+-- p_songs: JSON array of objects keyed by Songs column names, e.g.
+-- [{"Title": "...", "artistId": 1, "albumId": 1, "genreId": 2,
+--   "releaseDate": "2024-01-01", "audioFile": "x.mp3", "thumbnail": "x.jpg"}]
+CREATE PROCEDURE BatchInsertSongs(IN p_songs JSON)
+BEGIN
+    INSERT INTO Songs (Title, artistId, albumId, genreId, releaseDate, audioFile, thumbnail)
+    SELECT j.Title, j.artistId, j.albumId, j.genreId, j.releaseDate, j.audioFile, j.thumbnail
+    FROM JSON_TABLE(p_songs, '$[*]' COLUMNS (
+        Title VARCHAR(255) PATH '$.Title',
+        artistId INT PATH '$.artistId',
+        albumId INT PATH '$.albumId',
+        genreId INT PATH '$.genreId',
+        releaseDate DATE PATH '$.releaseDate',
+        audioFile VARCHAR(512) PATH '$.audioFile',
+        thumbnail VARCHAR(512) PATH '$.thumbnail'
+    )) AS j;
+END $$
+DELIMITER ;
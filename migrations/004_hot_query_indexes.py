@@ -0,0 +1,37 @@
+# Indexes for the queries db.py runs on every page. Created only when
+# missing, since hand-made databases may already have some of them.
+
+INDEXES = [
+    # user_exists / login_user
+    ("Users", "uq_users_name", "UNIQUE", "(name)"),
+    # playlist_exists, get_user_playlists*
+    ("Playlists", "uq_playlists_user_name", "UNIQUE", "(userId, name)"),
+    # delete by song, GetTopSongs join (playlistId lookups use the primary key)
+    ("PlaylistSongs", "idx_playlistsongs_song", "", "(songId)"),
+    # get_song_id_by_title, search_song_titles prefix LIKE (covers song_id)
+    ("Songs", "idx_songs_title", "", "(Title)"),
+    # get_recent_songs: ordered scan that also covers Title
+    ("Songs", "idx_songs_release_title", "", "(releaseDate, Title)"),
+    # Bulk_Import sync: update/delete by file
+    ("Songs", "idx_songs_audio_file", "", "(audioFile)"),
+    # search_songs genre filter, get_all_genres
+    ("Genres", "uq_genres_name", "UNIQUE", "(genreName)"),
+    # refresh_play_counts scans the last 7 days and groups by song
+    ("PlayEvents", "idx_playevents_played_song", "", "(playedAt, songId)"),
+    # get_play_counts / get_top_songs ranking
+    ("SongPlayCounts", "idx_songplaycounts_rank", "", "(plays_24h, plays_7d)"),
+]
+
+
+def index_exists(cur, table, name):
+    cur.execute("""
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+    """, (table, name))
+    return cur.fetchone() is not None
+
+
+def upgrade(cur):
+    for table, name, kind, columns in INDEXES:
+        if not index_exists(cur, table, name):
+            cur.execute(" ".join(filter(None, ["CREATE", kind, "INDEX", name, "ON", table, columns])))
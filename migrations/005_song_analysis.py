@@ -0,0 +1,23 @@
+# Columns filled by the import-time audio analysis (analysis.py). NULL until
+# a song is analysed; `python Bulk_Import.py --analyze-missing` backfills.
+
+COLUMNS = [
+    ("duration", "FLOAT NULL"),            # seconds
+    ("loudness", "FLOAT NULL"),            # integrated loudness, LUFS
+    ("replayGain", "FLOAT NULL"),          # dB to reach analysis.REFERENCE_LOUDNESS
+    ("waveform", "VARBINARY(256) NULL"),   # one peak byte per analysis.WAVEFORM_POINTS slice
+]
+
+
+def column_exists(cur, table, column):
+    cur.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    """, (table, column))
+    return cur.fetchone() is not None
+
+
+def upgrade(cur):
+    for column, definition in COLUMNS:
+        if not column_exists(cur, "Songs", column):
+            cur.execute(f"ALTER TABLE Songs ADD COLUMN {column} {definition}")
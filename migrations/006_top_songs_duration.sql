@@ -0,0 +1,17 @@
+-- GetTopSongs also returns the analysis columns from 005, so Home shows
+-- track length before any plays are recorded.
+
+DROP PROCEDURE IF EXISTS GetTopSongs;
+
+DELIMITER $$
+CREATE PROCEDURE GetTopSongs(IN p_limit INT)
+BEGIN
+    SELECT s.song_id, s.Title, s.audioFile, s.thumbnail, s.duration, s.replayGain,
+           COUNT(ps.songId) AS playlist_count
+    FROM Songs s
+    LEFT JOIN PlaylistSongs ps ON ps.songId = s.song_id
+    GROUP BY s.song_id, s.Title, s.audioFile, s.thumbnail, s.duration, s.replayGain
+    ORDER BY playlist_count DESC, s.song_id
+    LIMIT p_limit;
+END $$
+DELIMITER ;
@@ -0,0 +1,10 @@
+-- Top-N similar songs per song (playlist co-occurrence cosine), written by
+-- similar.py. Song ids are not foreign keys: rows for deleted songs are
+-- dropped by the next refresh.
+
+CREATE TABLE IF NOT EXISTS SongSimilarities (
+    songId INT NOT NULL,
+    similarId INT NOT NULL,
+    score FLOAT NOT NULL,
+    PRIMARY KEY (songId, similarId)
+);
@@ -0,0 +1,7 @@
+-- The artist, album and genre rows Bulk_Import.py files new songs under
+-- (DEFAULT_ARTIST_ID etc.); Songs has foreign keys on all three. IGNORE
+-- keeps whatever a database already has under those ids.
+
+INSERT IGNORE INTO Artists (artistId, artistName) VALUES (1, 'Unknown Artist');
+INSERT IGNORE INTO Albums (albumId, albumName, artistId) VALUES (1, 'Unknown Album', 1);
+INSERT IGNORE INTO Genres (genreId, genreName) VALUES (2, 'Unknown');
@@ -0,0 +1,78 @@
+-- SQLite version of migrations/001_schema.sql through 004. Stored
+-- procedures are emulated in backends.SQLITE_PROCEDURES.
+
+CREATE TABLE IF NOT EXISTS Users (
+    user_id INTEGER PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    password VARCHAR(255) NOT NULL,
+    subscription_type VARCHAR(20) NOT NULL DEFAULT 'Free',
+    date_joined DATE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS Artists (
+    artistId INTEGER PRIMARY KEY,
+    artistName VARCHAR(255) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS Albums (
+    albumId INTEGER PRIMARY KEY,
+    albumName VARCHAR(255) NOT NULL,
+    artistId INTEGER NULL REFERENCES Artists (artistId)
+);
+
+CREATE TABLE IF NOT EXISTS Genres (
+    genreId INTEGER PRIMARY KEY,
+    genreName VARCHAR(100) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS Songs (
+    song_id INTEGER PRIMARY KEY,
+    Title VARCHAR(255) NOT NULL,
+    artistId INTEGER NULL REFERENCES Artists (artistId),
+    albumId INTEGER NULL REFERENCES Albums (albumId),
+    genreId INTEGER NULL REFERENCES Genres (genreId),
+    releaseDate DATE NULL,
+    audioFile VARCHAR(512) NULL,
+    thumbnail VARCHAR(512) NULL
+);
+
+CREATE TABLE IF NOT EXISTS Playlists (
+    playlistId INTEGER PRIMARY KEY,
+    userId INTEGER NOT NULL REFERENCES Users (user_id),
+    name VARCHAR(255) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS PlaylistSongs (
+    playlistId INTEGER NOT NULL REFERENCES Playlists (playlistId),
+    songId INTEGER NOT NULL REFERENCES Songs (song_id),
+    PRIMARY KEY (playlistId, songId)
+);
+
+CREATE TABLE IF NOT EXISTS PlayEvents (
+    eventId INTEGER PRIMARY KEY,
+    userId INTEGER NULL,
+    songId INTEGER NOT NULL,
+    playedAt DATETIME NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS SongPlayCounts (
+    songId INTEGER PRIMARY KEY,
+    plays_1h INTEGER NOT NULL DEFAULT 0,
+    plays_24h INTEGER NOT NULL DEFAULT 0,
+    plays_7d INTEGER NOT NULL DEFAULT 0,
+    refreshedAt DATETIME NOT NULL
+);
+
+-- Same indexes as migrations/004_hot_query_indexes.py.
+CREATE UNIQUE INDEX IF NOT EXISTS uq_users_name ON Users (name);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_playlists_user_name ON Playlists (userId, name);
+CREATE INDEX IF NOT EXISTS idx_playlistsongs_song ON PlaylistSongs (songId);
+CREATE INDEX IF NOT EXISTS idx_songs_title ON Songs (Title);
+CREATE INDEX IF NOT EXISTS idx_songs_release_title ON Songs (releaseDate, Title);
+CREATE INDEX IF NOT EXISTS idx_songs_audio_file ON Songs (audioFile);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_genres_name ON Genres (genreName);
+CREATE INDEX IF NOT EXISTS idx_playevents_played_song ON PlayEvents (playedAt, songId);
+CREATE INDEX IF NOT EXISTS idx_songplaycounts_rank ON SongPlayCounts (plays_24h, plays_7d);
+-- MySQL indexes foreign keys implicitly; SQLite needs this one for the
+-- search_songs genre filter.
+CREATE INDEX IF NOT EXISTS idx_songs_genre ON Songs (genreId);
@@ -0,0 +1,5 @@
+-- Columns filled by the import-time audio analysis (analysis.py).
+ALTER TABLE Songs ADD COLUMN duration REAL NULL;
+ALTER TABLE Songs ADD COLUMN loudness REAL NULL;
+ALTER TABLE Songs ADD COLUMN replayGain REAL NULL;
+ALTER TABLE Songs ADD COLUMN waveform BLOB NULL;
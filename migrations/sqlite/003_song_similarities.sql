@@ -0,0 +1,7 @@
+-- Top-N similar songs per song, written by similar.py.
+CREATE TABLE IF NOT EXISTS SongSimilarities (
+    songId INTEGER NOT NULL,
+    similarId INTEGER NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (songId, similarId)
+);
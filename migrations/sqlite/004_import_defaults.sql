@@ -0,0 +1,4 @@
+-- The rows Bulk_Import.py files new songs under; see migrations/008.
+INSERT OR IGNORE INTO Artists (artistId, artistName) VALUES (1, 'Unknown Artist');
+INSERT OR IGNORE INTO Albums (albumId, albumName, artistId) VALUES (1, 'Unknown Album', 1);
+INSERT OR IGNORE INTO Genres (genreId, genreName) VALUES (2, 'Unknown');
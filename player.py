@@ -0,0 +1,233 @@
+import base64
+import json
+import os
+import uuid
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+import stream_server
+
+# --- Config ---
+PLAYER_HEIGHT = 104
+
+# The playback engine is injected once into the Streamlit page itself (the
+# component iframe's parent), so its two <audio> elements outlive reruns and
+# the iframe being re-created; the iframe only draws the controls. While one
+# deck plays, the other has the next track loaded with preload="auto", so the
+# browser already holds its first chunk and advancing is a swap, not a fetch.
+PLAYER_HTML = """
+<style>
+  body { margin: 0; font-family: "Source Sans Pro", sans-serif; color: #fafafa; }
+  .player { background: #1e1e1e; border-radius: 8px; padding: 8px 10px; }
+  .title { font-size: 14px; font-weight: 600; white-space: nowrap; overflow: hidden; text-overflow: ellipsis; }
+  .meta { font-size: 12px; opacity: 0.7; }
+  .controls { display: flex; align-items: center; gap: 6px; margin-top: 6px; }
+  button { background: #5c5c5c; color: white; border: 0; border-radius: 4px; padding: 3px 10px; cursor: pointer; }
+  button:disabled { opacity: 0.4; cursor: default; }
+  canvas { flex: 1; min-width: 0; height: 24px; cursor: pointer; }
+</style>
+<div class="player">
+  <div class="title" id="title">Nothing playing</div>
+  <div class="meta" id="meta"></div>
+  <div class="controls">
+    <button id="prev">⏮</button><button id="toggle">▶</button><button id="next">⏭</button>
+    <canvas id="wave"></canvas>
+  </div>
+</div>
+<script>
+const STATE = __STATE__;
+
+function engine() {
+  if (window.treblePlayer) return;
+  const decks = [new Audio(), new Audio()];
+  const player = {queue: [], index: -1, request: null, active: 0, view: null};
+  const current = () => decks[player.active];
+  const standby = () => decks[1 - player.active];
+
+  function notify() {
+    try { if (player.view) player.view(); } catch (e) { player.view = null; }
+  }
+  function cue(deck, track) {
+    if (deck.trebleUrl !== track.url) {
+      deck.trebleUrl = track.url;
+      deck.preload = "auto";
+      deck.src = track.url;
+    }
+  }
+  function level(deck, track) {
+    // ReplayGain can only be applied downwards: volume tops out at 1.
+    deck.volume = track.gain == null ? 1 : Math.min(1, Math.pow(10, track.gain / 20));
+  }
+  function prefetch() {
+    const next = player.queue[player.index + 1];
+    if (next) cue(standby(), next);
+  }
+  function report(deck) {
+    // Each track start counts as one play, sent once the audio really plays
+    // (not if autoplay is blocked), including next, previous and auto-advance.
+    const url = deck.trebleReport;
+    deck.trebleReport = null;
+    if (!url) return;
+    if (navigator.sendBeacon && navigator.sendBeacon(url)) return;
+    fetch(url, {method: "POST", mode: "no-cors", keepalive: true}).catch(() => {});
+  }
+  player.play = function (i) {
+    const track = player.queue[i];
+    if (!track) return;
+    current().pause();
+    if (standby().trebleUrl === track.url) {
+      player.active = 1 - player.active;
+    } else {
+      cue(current(), track);
+    }
+    const deck = current();
+    if (deck.currentTime) deck.currentTime = 0;
+    level(deck, track);
+    player.index = i;
+    deck.trebleReport = track.played;
+    deck.play().catch(() => {});
+    prefetch();
+    notify();
+  };
+  player.next = () => player.play(player.index + 1);
+  player.prev = function () {
+    if (current().currentTime > 3 || player.index === 0) {
+      current().currentTime = 0;
+    } else {
+      player.play(player.index - 1);
+    }
+  };
+  player.seek = function (fraction) {
+    const deck = current();
+    if (deck.duration) deck.currentTime = fraction * deck.duration;
+  };
+  player.toggle = function () {
+    const deck = current();
+    if (!deck.src) return;
+    if (deck.paused) deck.play().catch(() => {}); else deck.pause();
+  };
+  player.load = function (queue, start, request) {
+    if (request === player.request) return;
+    player.request = request;
+    player.queue = queue;
+    player.play(start);
+  };
+  player.state = function () {
+    const deck = current();
+    return {track: player.queue[player.index], index: player.index, size: player.queue.length,
+            paused: deck.paused, position: deck.currentTime, duration: deck.duration};
+  };
+  decks.forEach(deck => {
+    deck.addEventListener("ended", () => { if (deck === current()) player.next(); });
+    deck.addEventListener("playing", () => { if (deck === current()) report(deck); });
+    ["play", "pause", "timeupdate", "loadedmetadata"].forEach(
+      name => deck.addEventListener(name, () => { if (deck === current()) notify(); }));
+  });
+  window.treblePlayer = player;
+}
+
+let host = window;
+try {
+  if (window.parent.document) host = window.parent;
+} catch (e) {
+  // Cross-origin parent: play inside this frame instead (stops on rerun).
+}
+if (!host.treblePlayer) {
+  const script = host.document.createElement("script");
+  script.textContent = "(" + engine.toString() + ")();";
+  host.document.head.appendChild(script);
+}
+const player = host.treblePlayer;
+
+const wave = document.getElementById("wave");
+let peaks = null;
+let peaksOf = null;
+
+function drawWave(s) {
+  if (s.track !== peaksOf) {
+    peaksOf = s.track;
+    peaks = s.track && s.track.peaks ? Uint8Array.from(atob(s.track.peaks), c => c.charCodeAt(0)) : null;
+  }
+  const ratio = window.devicePixelRatio || 1;
+  wave.width = wave.clientWidth * ratio;
+  wave.height = wave.clientHeight * ratio;
+  const ctx = wave.getContext("2d");
+  const played = s.duration ? (s.position || 0) / s.duration : 0;
+  const middle = wave.height / 2;
+  // Without a waveform (not analysed yet) this is a plain progress bar.
+  const bars = peaks ? peaks.length : 1;
+  const width = wave.width / bars;
+  for (let i = 0; i < bars; i++) {
+    const height = peaks ? Math.max(ratio, (peaks[i] / 255) * wave.height) : 3 * ratio;
+    ctx.fillStyle = (i + 0.5) / bars <= played ? "#ff4b4b" : "#5c5c5c";
+    ctx.fillRect(i * width, middle - height / 2, Math.max(width - (peaks ? ratio * 0.5 : 0), ratio), height);
+  }
+  if (!peaks) {
+    ctx.fillStyle = "#ff4b4b";
+    ctx.fillRect(0, middle - 1.5 * ratio, played * wave.width, 3 * ratio);
+  }
+}
+
+function render() {
+  const s = player.state();
+  document.getElementById("title").textContent = s.track ? s.track.title : "Nothing playing";
+  document.getElementById("meta").textContent = s.track ? `${s.index + 1} of ${s.size}` : "";
+  document.getElementById("toggle").textContent = s.paused ? "▶" : "⏸";
+  document.getElementById("prev").disabled = !s.track;
+  document.getElementById("next").disabled = !s.track || s.index + 1 >= s.size;
+  drawWave(s);
+}
+document.getElementById("prev").onclick = () => player.prev();
+document.getElementById("toggle").onclick = () => player.toggle();
+document.getElementById("next").onclick = () => player.next();
+wave.onclick = event => player.seek(event.offsetX / wave.clientWidth);
+player.view = render;
+window.addEventListener("pagehide", () => { if (player.view === render) player.view = null; });
+if (STATE.request) player.load(STATE.queue, STATE.start, STATE.request);
+render();
+</script>
+"""
+
+
+def playable(songs):
+    return [song for song in songs
+            if song.get("audioFile") and os.path.exists(os.path.join(stream_server.SONG_DIR, song["audioFile"]))]
+
+
+def track(song, token, waveform=None):
+    return {"song_id": song["song_id"], "title": song["Title"],
+            "url": stream_server.audio_url(song["audioFile"], token),
+            "played": stream_server.played_url(song["song_id"], token),
+            "gain": song.get("replayGain"),
+            "peaks": base64.b64encode(waveform).decode("ascii") if waveform else None}
+
+
+def play(songs, start_song_id=None, token=None, waveforms=None):
+    # Replaces the queue with `songs` and starts at start_song_id, streamed
+    # with the session's stream token (stream_server.session_token), which
+    # also fixes the rendition tier. `waveforms` ({song_id: peak bytes})
+    # is drawn as the progress bar. Returns the song that will play, or None
+    # if none of them has audio.
+    queue = playable(songs)
+    start = next((i for i, song in enumerate(queue) if song["song_id"] == start_song_id), 0)
+    waveforms = waveforms or {}
+    st.session_state["player"] = {
+        "queue": [track(song, token, waveforms.get(song["song_id"])) for song in queue],
+        "start": start,
+        # New on every call, so the page-side player can tell a fresh
+        # request from a rerun re-sending the same one.
+        "request": uuid.uuid4().hex,
+    }
+    return queue[start] if queue else None
+
+
+def render():
+    state = st.session_state.get("player") or {"queue": [], "start": 0, "request": None}
+    # "</" would end the <script> early if a title contained it.
+    payload = json.dumps(state).replace("</", "<\\/")
+    html = PLAYER_HTML.replace("__STATE__", payload)
+    if hasattr(st, "iframe"):
+        st.iframe(html, height=PLAYER_HEIGHT)
+    else:  # Streamlit before st.iframe
+        components.html(html, height=PLAYER_HEIGHT)
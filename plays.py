@@ -0,0 +1,125 @@
+import atexit
+import os
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+import db
+from trending import leaderboard
+
+# --- Config ---
+PLAY_FLUSH_SIZE = int(os.environ.get("TREBLE_PLAY_FLUSH_SIZE", "200"))
+PLAY_FLUSH_INTERVAL = float(os.environ.get("TREBLE_PLAY_FLUSH_INTERVAL", "5"))
+PLAY_REFRESH_INTERVAL = float(os.environ.get("TREBLE_PLAY_REFRESH_INTERVAL", "60"))
+# Plays held in memory while the database is unreachable; oldest are dropped.
+PLAY_BUFFER_LIMIT = int(os.environ.get("TREBLE_PLAY_BUFFER_LIMIT", "50000"))
+
+
+class PlayBuffer:
+    def __init__(self, flush_size=PLAY_FLUSH_SIZE, flush_interval=PLAY_FLUSH_INTERVAL,
+                 refresh_interval=PLAY_REFRESH_INTERVAL, limit=PLAY_BUFFER_LIMIT):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.refresh_interval = refresh_interval
+        self._events = deque(maxlen=limit)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+        self.recorded = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.dropped = 0
+        self.refreshes = 0
+        self.last_refresh = None
+
+    def record(self, user_id, song_id, played_at=None):
+        with self._lock:
+            if len(self._events) == self._events.maxlen:
+                self.dropped += 1
+            self._events.append((user_id, song_id, played_at or datetime.now()))
+            self.recorded += 1
+            full = len(self._events) >= self.flush_size
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                events = list(self._events)
+                self._events.clear()
+            if not events:
+                return 0
+            if not db.insert_play_events(events):
+                # Put them back in front of anything recorded meanwhile.
+                with self._lock:
+                    room = self._events.maxlen - len(self._events)
+                    self.dropped += max(len(events) - room, 0)
+                    self._events.extendleft(reversed(events[-room:] if room else []))
+                return 0
+            with self._lock:
+                self.flushed += len(events)
+                self.flushes += 1
+            leaderboard.add_plays(Counter(song_id for _, song_id, _ in events))
+            return len(events)
+
+    def refresh(self):
+        if db.refresh_play_counts():
+            rows = db.get_play_counts(leaderboard.size)
+            if rows is not None:
+                leaderboard.load(rows)
+            with self._lock:
+                self.refreshes += 1
+                self.last_refresh = datetime.now()
+
+    def _run(self):
+        next_refresh = time.monotonic()
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+            if time.monotonic() >= next_refresh:
+                self.refresh()
+                next_refresh = time.monotonic() + self.refresh_interval
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="treble-plays", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "buffered": len(self._events),
+                "recorded": self.recorded,
+                "flushed": self.flushed,
+                "flushes": self.flushes,
+                "dropped": self.dropped,
+                "refreshes": self.refreshes,
+                "last_refresh": self.last_refresh,
+            }
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = PlayBuffer()
+                _buffer.start()
+    return _buffer
+
+
+def record_play(user_id, song_id):
+    get_buffer().record(user_id, song_id)
+
+
+def play_stats():
+    return get_buffer().stats()
@@ -0,0 +1,160 @@
+import threading
+import time
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+class PooledConnection:
+    # Thin proxy handed out by the pool: close() gives the connection back
+    # instead of tearing down the socket, so db.py helpers keep working as-is.
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise AttributeError(f"connection already returned to pool: {name}")
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ConnectionPool:
+    def __init__(self, connect, size=5, timeout=5.0, ping=None, reconnect_attempts=3, reconnect_delay=0.2):
+        self._connect = connect
+        self._ping = ping
+        self.size = size
+        self.timeout = timeout
+        self.reconnect_attempts = reconnect_attempts
+        self.reconnect_delay = reconnect_delay
+
+        # Idle connections, most recently used last. Waiters are woken both
+        # when one comes back and when a discard frees room to open another.
+        self._idle = []
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._created = 0
+
+        self.checkouts = 0
+        self.misses = 0
+        self.timeouts = 0
+        self.reconnects = 0
+        self.wait_time = 0.0
+
+    def _new_connection(self):
+        last_err = None
+        for attempt in range(self.reconnect_attempts):
+            try:
+                return self._connect()
+            except Exception as err:
+                last_err = err
+                time.sleep(self.reconnect_delay * (attempt + 1))
+        raise last_err
+
+    def _healthy(self, conn):
+        if self._ping is None:
+            return True
+        try:
+            return self._ping(conn)
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _free_slot(self):
+        with self._available:
+            self._created -= 1
+            self._available.notify()
+
+    def _discard(self, conn):
+        self._close_quietly(conn)
+        self._free_slot()
+
+    def get_connection(self):
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        conn = None
+        with self._available:
+            if not self._idle:
+                self.misses += 1
+            while conn is None:
+                if self._idle:
+                    conn = self._idle.pop()
+                elif self._created < self.size:
+                    self._created += 1
+                    break
+                else:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolExhausted(f"no connection available after {self.timeout}s (size={self.size})")
+                    self._available.wait(remaining)
+
+        if conn is None:
+            try:
+                conn = self._new_connection()
+            except Exception:
+                self._free_slot()
+                raise
+        elif not self._healthy(conn):
+            # Replaced in the same slot, so a waiter can't take it meanwhile.
+            self._close_quietly(conn)
+            with self._lock:
+                self.reconnects += 1
+            try:
+                conn = self._new_connection()
+            except Exception:
+                self._free_slot()
+                raise
+
+        with self._lock:
+            self.checkouts += 1
+            self.wait_time += time.perf_counter() - start
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        try:
+            if getattr(conn, "in_transaction", False):
+                conn.rollback()
+        except Exception:
+            self._discard(conn)
+            return
+        with self._available:
+            self._idle.append(conn)
+            self._available.notify()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": self._created,
+                "idle": len(self._idle),
+                "checkouts": self.checkouts,
+                "misses": self.misses,
+                "timeouts": self.timeouts,
+                "reconnects": self.reconnects,
+                "wait_time": self.wait_time,
+                "avg_wait_ms": (self.wait_time / self.checkouts * 1000) if self.checkouts else 0.0,
+            }
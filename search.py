@@ -0,0 +1,239 @@
+import bisect
+import heapq
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+
+# Relative weight of a match in each indexed field.
+FIELD_WEIGHTS = {
+    "Title": 3.0,
+    "artist": 2.0,
+    "album": 1.5,
+    "genre": 1.0,
+}
+
+# How much a query word is worth when it matches an indexed word exactly,
+# as the start of the word (only for the last, still-being-typed word),
+# somewhere inside it, or only approximately (typos).
+EXACT_MATCH = 1.0
+PREFIX_MATCH = 0.9
+SUBSTRING_MATCH = 0.7
+FUZZY_MATCH = 0.6
+
+# Minimum Dice coefficient over trigrams for a typo to still count as a match.
+MIN_SIMILARITY = 0.4
+# Cap on how many indexed words one query word may expand to.
+MAX_EXPANSIONS = 64
+
+_NON_WORD_RE = re.compile(r"[^\w]+")
+
+# Scores are rounded to this many places before songs are grouped by them, so
+# float noise never splits songs of equal rank across two levels.
+SCORE_PLACES = 6
+
+
+def normalize(text):
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(_NON_WORD_RE.sub(" ", text.lower()).split())
+
+
+def trigrams(word, padded=True):
+    # pg_trgm-style padding: two spaces before the word and one after, so
+    # the start and end of a word get grams of their own.
+    if padded:
+        word = f"  {word} "
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+class SearchIndex:
+    def __init__(self):
+        self._docs = {}
+        self._doc_words = {}
+        self._postings = {field: defaultdict(set) for field in FIELD_WEIGHTS}
+        self._vocab = Counter()
+        self._vocab_grams = defaultdict(set)
+        self._sorted_vocab = []
+        self._vocab_dirty = False
+        self._lock = threading.RLock()
+        self.max_id = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, song_id):
+        return song_id in self._docs
+
+    # --- Maintenance ---
+    def add(self, song):
+        song_id = song["song_id"]
+        words = {field: set(normalize(song.get(field)).split()) for field in FIELD_WEIGHTS}
+        with self._lock:
+            if song_id in self._docs:
+                self._unindex(song_id)
+            self._docs[song_id] = dict(song)
+            self._doc_words[song_id] = words
+            for field, field_words in words.items():
+                postings = self._postings[field]
+                for word in field_words:
+                    postings[word].add(song_id)
+            for word in set().union(*words.values()):
+                if not self._vocab[word]:
+                    for gram in trigrams(word):
+                        self._vocab_grams[gram].add(word)
+                    self._vocab_dirty = True
+                self._vocab[word] += 1
+            self.max_id = max(self.max_id, song_id)
+
+    def add_many(self, songs):
+        for song in songs:
+            self.add(song)
+
+    def remove(self, song_id):
+        with self._lock:
+            if song_id in self._docs:
+                self._unindex(song_id)
+                del self._docs[song_id]
+                del self._doc_words[song_id]
+
+    def _unindex(self, song_id):
+        words = self._doc_words[song_id]
+        for field, field_words in words.items():
+            postings = self._postings[field]
+            for word in field_words:
+                postings[word].discard(song_id)
+                if not postings[word]:
+                    del postings[word]
+        for word in set().union(*words.values()):
+            self._vocab[word] -= 1
+            if not self._vocab[word]:
+                del self._vocab[word]
+                for gram in trigrams(word):
+                    self._vocab_grams[gram].discard(word)
+                self._vocab_dirty = True
+
+    def get(self, song_id):
+        return self._docs.get(song_id)
+
+    # --- Querying ---
+    def _expand(self, term, prefix):
+        # Map one query word to the indexed words it matches, with a weight.
+        # Everything here runs over the vocabulary, not over songs.
+        matches = {}
+        if term in self._vocab:
+            matches[term] = EXACT_MATCH
+
+        if prefix:
+            if self._vocab_dirty:
+                self._sorted_vocab = sorted(self._vocab)
+                self._vocab_dirty = False
+            start = bisect.bisect_left(self._sorted_vocab, term)
+            for word in self._sorted_vocab[start:start + MAX_EXPANSIONS]:
+                if not word.startswith(term):
+                    break
+                matches.setdefault(word, PREFIX_MATCH)
+
+        if len(term) >= 3:
+            inner = trigrams(term, padded=False)
+            words = set.intersection(*(self._vocab_grams.get(gram, set()) for gram in inner))
+            for word in heapq.nsmallest(MAX_EXPANSIONS, words, key=lambda w: (len(w), w)):
+                if term in word:
+                    matches.setdefault(word, SUBSTRING_MATCH)
+
+            term_grams = trigrams(term)
+            shared = Counter()
+            for gram in term_grams:
+                shared.update(self._vocab_grams.get(gram, ()))
+            for word, count in heapq.nsmallest(MAX_EXPANSIONS, shared.items(), key=lambda item: (-item[1], item[0])):
+                dice = 2 * count / (len(term_grams) + len(word) + 1)
+                if dice >= MIN_SIMILARITY:
+                    matches.setdefault(word, FUZZY_MATCH * dice)
+        return matches
+
+    def _term_levels(self, term, prefix):
+        # Songs matching one query word, grouped by score, best first. Each
+        # song lands in the first (highest) level it reaches, so the grouping
+        # is done with set operations instead of per-song Python work. Matches
+        # that score the same (say, two prefix expansions in the same field)
+        # share one level.
+        weighted = []
+        for word, similarity in self._expand(term, prefix).items():
+            for field, weight in FIELD_WEIGHTS.items():
+                ids = self._postings[field].get(word)
+                if ids:
+                    weighted.append((round(similarity * weight, SCORE_PLACES), ids))
+        weighted.sort(key=lambda item: -item[0])
+
+        seen = set()
+        levels = {}
+        for score, ids in weighted:
+            fresh = ids - seen
+            if fresh:
+                seen |= fresh
+                levels.setdefault(score, set()).update(fresh)
+        return list(levels.items())
+
+    def search(self, query, genre=None, offset=0, limit=None, after=None):
+        terms = normalize(query).split()
+        if not terms:
+            return [], 0
+
+        with self._lock:
+            per_term = [self._term_levels(term, prefix=(i == len(terms) - 1))
+                        for i, term in enumerate(terms)]
+
+            if len(per_term) == 1:
+                levels = per_term[0]
+            else:
+                # Every query word must match; scores add up. Narrow down to
+                # songs matching all words first so only those get summed.
+                by_size = sorted(per_term, key=lambda term_levels: sum(len(ids) for _, ids in term_levels))
+                candidates = set().union(*(ids for _, ids in by_size[0]))
+                for term_levels in by_size[1:]:
+                    candidates = set().union(*(candidates & ids for _, ids in term_levels))
+                totals = dict.fromkeys(candidates, 0.0)
+                for term_levels in per_term:
+                    for score, ids in term_levels:
+                        for song_id in ids & candidates:
+                            totals[song_id] += score
+                grouped = defaultdict(set)
+                for song_id, score in totals.items():
+                    grouped[round(score, SCORE_PLACES)].add(song_id)
+                levels = sorted(grouped.items(), key=lambda item: -item[0])
+
+            if genre:
+                genre_ids = self._genre_ids(normalize(genre))
+                levels = [(score, ids & genre_ids) for score, ids in levels]
+
+            total = sum(len(ids) for _, ids in levels)
+            if after is not None:
+                # Keyset cursor: the (score, song_id) of the last song already
+                # shown; resume strictly after it in (-score, song_id) order.
+                after_score, after_id = after
+                levels = [(score, {song_id for song_id in ids if song_id > after_id})
+                          if score == after_score else (score, ids)
+                          for score, ids in levels if score <= after_score]
+            end = offset + limit if limit is not None else total
+            results = []
+            position = 0
+            # Stable order: best score first, then oldest song. Only the
+            # levels overlapping the requested page get sorted.
+            for score, ids in levels:
+                if position >= end:
+                    break
+                if position + len(ids) > offset:
+                    for song_id in sorted(ids)[max(offset - position, 0):end - position]:
+                        results.append(dict(self._docs[song_id], score=score))
+                position += len(ids)
+        return results, total
+
+    def _genre_ids(self, genre):
+        words = genre.split()
+        if not words:
+            return set()
+        postings = self._postings["genre"]
+        ids = set.intersection(*(postings.get(word, set()) for word in words))
+        return {song_id for song_id in ids if normalize(self._docs[song_id].get("genre")) == genre}
@@ -0,0 +1,239 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+from scipy import sparse
+
+import db
+
+# --- Config ---
+SIMILAR_TOP_N = int(os.environ.get("TREBLE_SIMILAR_TOP_N", "20"))
+# Seconds between incremental refreshes; adding a song to a playlist in this
+# process triggers one right away.
+SIMILAR_REFRESH_INTERVAL = float(os.environ.get("TREBLE_SIMILAR_REFRESH_INTERVAL", "60"))
+# Seconds between full recomputes, which also pick up changes made while no
+# app process was running.
+SIMILAR_REBUILD_INTERVAL = float(os.environ.get("TREBLE_SIMILAR_REBUILD_INTERVAL", "3600"))
+# Rows of the similarity product computed at once; bounds its memory.
+SIMILAR_CHUNK_ROWS = 2048
+
+
+def pair_keys(pairs):
+    # (song_id, playlist_id) rows as one sorted array of song_id << 32 | playlist_id.
+    pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+    return np.unique(pairs[:, 0] << 32 | pairs[:, 1])
+
+
+def affected_songs(old_keys, new_keys):
+    # Songs whose neighbours may have moved: every song sharing a playlist,
+    # before or after, with a song that joined or left one. (A song's
+    # cosine with everything it co-occurs with changes with its own count.)
+    changed = np.unique(np.setxor1d(old_keys, new_keys, assume_unique=True) >> 32)
+    both = np.concatenate([old_keys, new_keys])
+    playlists = np.unique(both[np.isin(both >> 32, changed)] & 0xFFFFFFFF)
+    return np.union1d(changed, np.unique(both[np.isin(both & 0xFFFFFFFF, playlists)] >> 32))
+
+
+def top_neighbours(keys, song_ids, top_n=SIMILAR_TOP_N):
+    # {song_id: [(similar_id, score)]} for each of song_ids: item-item cosine
+    # over the binary song x playlist matrix, best first. Songs in no
+    # playlist get [].
+    result = {int(song_id): [] for song_id in song_ids}
+    if not len(keys):
+        return result
+    songs, song_rows = np.unique(keys >> 32, return_inverse=True)
+    _, playlist_cols = np.unique(keys & 0xFFFFFFFF, return_inverse=True)
+    matrix = sparse.csr_matrix((np.ones(len(keys)), (song_rows, playlist_cols)),
+                               shape=(len(songs), playlist_cols.max() + 1))
+    norms = np.sqrt(np.asarray(matrix.sum(axis=1)).ravel())
+    matrix = sparse.diags(1 / norms).dot(matrix).tocsr()
+    transposed = matrix.T.tocsr()
+
+    positions = np.searchsorted(songs, np.asarray(song_ids, dtype=np.int64))
+    present = positions < len(songs)
+    present[present] = songs[positions[present]] == np.asarray(song_ids, dtype=np.int64)[present]
+    rows = positions[present]
+    for start in range(0, len(rows), SIMILAR_CHUNK_ROWS):
+        chunk = rows[start:start + SIMILAR_CHUNK_ROWS]
+        product = matrix[chunk].dot(transposed).tocsr()
+        owner = np.repeat(np.arange(len(chunk)), np.diff(product.indptr))
+        # Rounded first, so songs with equal scores tie-break on song_id.
+        cols, scores = product.indices, np.round(product.data, 4)
+        keep = cols != chunk[owner]
+        owner, cols, scores = owner[keep], cols[keep], scores[keep]
+        # Per row: best score first, then oldest song; keep the first top_n.
+        order = np.lexsort((cols, -scores, owner))
+        owner, cols, scores = owner[order], cols[order], scores[order]
+        rank = np.arange(len(owner)) - np.searchsorted(owner, owner)
+        top = rank < top_n
+        owner, similar, scores = owner[top], songs[cols[top]], scores[top]
+        bounds = np.searchsorted(owner, np.arange(len(chunk) + 1))
+        similar, scores = similar.tolist(), scores.tolist()
+        for i, row in enumerate(chunk.tolist()):
+            result[int(songs[row])] = list(zip(similar[bounds[i]:bounds[i + 1]], scores[bounds[i]:bounds[i + 1]]))
+    return result
+
+
+class SimilarityIndex:
+    # Top-N similar songs per song, held in memory for O(1) lookups and
+    # mirrored in SongSimilarities so a new process serves them at once.
+    def __init__(self, top_n=SIMILAR_TOP_N):
+        self.top_n = top_n
+        self._neighbours = {}
+        self._lock = threading.Lock()
+        self.keys = None  # the PlaylistSongs pairs the lists were computed from
+        self.version = 0
+        self.updated_at = None
+        self.loaded = False
+
+    def load(self, rows):
+        # rows: (songId, similarId, score), best first within each song.
+        neighbours = {}
+        for song_id, similar_id, score in rows:
+            neighbours.setdefault(song_id, []).append((similar_id, score))
+        with self._lock:
+            self._neighbours = neighbours
+            self._touch()
+            self.loaded = True
+
+    def update(self, keys, neighbours, full=False):
+        with self._lock:
+            if full:
+                self._neighbours = {}
+            for song_id, similar in neighbours.items():
+                if similar:
+                    self._neighbours[song_id] = similar
+                else:
+                    self._neighbours.pop(song_id, None)
+            self.keys = keys
+            self._touch()
+            self.loaded = True
+
+    def get(self, song_id, limit=None):
+        with self._lock:
+            return self._neighbours.get(song_id, [])[:limit]
+
+    def _touch(self):
+        self.version += 1
+        self.updated_at = datetime.now()
+
+    def stats(self):
+        with self._lock:
+            return {"songs": len(self._neighbours), "version": self.version,
+                    "updated_at": self.updated_at, "loaded": self.loaded}
+
+
+similarities = SimilarityIndex()
+
+
+class SimilarityRefresher:
+    def __init__(self, index=similarities, refresh_interval=SIMILAR_REFRESH_INTERVAL,
+                 rebuild_interval=SIMILAR_REBUILD_INTERVAL):
+        self.index = index
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self._wake = threading.Event()
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+        self.rebuilt_at = None
+
+        self.refreshes = 0
+        self.songs_updated = 0
+        self.last_refresh = None
+
+    def refresh(self, full=False):
+        with self._refresh_lock:
+            pairs = db.get_playlist_pairs()
+            if pairs is None:
+                return False
+            keys = pair_keys(pairs)
+            if self.index.keys is None and not full:
+                # First run in this process: the stored lists are taken as
+                # matching the current playlists (the next rebuild corrects
+                # them if not); with nothing stored, compute everything.
+                rows = db.get_song_similarities()
+                if rows:
+                    self.index.load(rows)
+                    self.index.update(keys, {})
+                    self.rebuilt_at = time.monotonic()
+                    return True
+                full = True
+            song_ids = np.unique(keys >> 32) if full else affected_songs(self.index.keys, keys)
+            neighbours = top_neighbours(keys, song_ids, self.index.top_n)
+            rows = [(song_id, similar_id, score)
+                    for song_id, similar in neighbours.items() for similar_id, score in similar]
+            if (full or neighbours) and not db.replace_song_similarities(None if full else list(neighbours), rows):
+                return False
+            self.index.update(keys, neighbours, full=full)
+            if full:
+                self.rebuilt_at = time.monotonic()
+            self.refreshes += 1
+            self.songs_updated += len(neighbours)
+            self.last_refresh = datetime.now()
+            return True
+
+    def playlist_changed(self):
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh(full=self.rebuilt_at is not None
+                             and time.monotonic() - self.rebuilt_at > self.rebuild_interval)
+            except Exception as e:
+                print(f"⚠️ Similar-songs refresh failed: {e}")
+            self._wake.wait(self.refresh_interval)
+            self._wake.clear()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="treble-similar", daemon=True)
+            self._thread.start()
+
+    def stats(self):
+        return dict(self.index.stats(), refreshes=self.refreshes, songs_updated=self.songs_updated,
+                    last_refresh=self.last_refresh)
+
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def get_refresher():
+    global _refresher
+    if _refresher is None:
+        with _refresher_lock:
+            if _refresher is None:
+                _refresher = SimilarityRefresher()
+                _refresher.start()
+    return _refresher
+
+
+def playlist_changed():
+    get_refresher().playlist_changed()
+
+
+# --- Lookups (in-memory; song details from the search index) ---
+def _details(song_ids):
+    index = db.get_search_index()
+    if index is None:
+        return []
+    return [song for song in map(index.get, song_ids) if song]
+
+
+def similar_songs(song_id, limit=5):
+    return _details(similar_id for similar_id, _ in similarities.get(song_id, limit))
+
+
+def recommend_for(song_ids, limit=5):
+    # Songs most similar to a set (a playlist) overall, excluding its own.
+    song_ids = set(song_ids)
+    scores = {}
+    for song_id in song_ids:
+        for similar_id, score in similarities.get(song_id):
+            if similar_id not in song_ids:
+                scores[similar_id] = scores.get(similar_id, 0.0) + score
+    best = sorted(scores, key=lambda similar_id: (-scores[similar_id], similar_id))[:limit]
+    return _details(best)
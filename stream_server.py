@@ -0,0 +1,359 @@
+import hashlib
+import hmac
+import ipaddress
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+import instrument
+import transcode
+
+# --- Config ---
+SONG_DIR = os.path.join(os.getcwd(), "songs")
+# Loopback by default; binding elsewhere also needs TREBLE_STREAM_URL, since
+# browsers on other hosts can't reach "localhost".
+STREAM_HOST = os.environ.get("TREBLE_STREAM_HOST", "127.0.0.1")
+STREAM_PORT = int(os.environ.get("TREBLE_STREAM_PORT", "8502"))
+STREAM_URL = os.environ.get("TREBLE_STREAM_URL", f"http://localhost:{STREAM_PORT}").rstrip("/")
+# Signs the per-session tokens every stream URL carries. Processes sharing
+# one stream server must share it; unset, each process picks a random one.
+STREAM_SECRET = os.environ.get("TREBLE_STREAM_SECRET", "").encode() or secrets.token_bytes(32)
+STREAM_TOKEN_TTL = int(os.environ.get("TREBLE_STREAM_TOKEN_TTL", str(12 * 3600)))
+# /metrics gets a listener of its own, on loopback unless a scrape token is
+# set; query timings and pool stats are not for the audio port's audience.
+METRICS_HOST = os.environ.get("TREBLE_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("TREBLE_METRICS_PORT", "8503"))  # 0 turns it off
+METRICS_TOKEN = os.environ.get("TREBLE_METRICS_TOKEN", "")
+CHUNK_SIZE = 64 * 1024
+# /played beacons carry no body; anything larger than this is refused.
+MAX_BEACON_BODY = 1024
+# A repeat beacon for the same user and song inside this many seconds is
+# dropped, so replaying the URL can't pump the play counts.
+PLAY_REPEAT_INTERVAL = float(os.environ.get("TREBLE_PLAY_REPEAT_INTERVAL", "30"))
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+_server = None
+_metrics_server = None
+_server_lock = threading.Lock()
+
+_recent_beacons = {}
+_beacons_lock = threading.Lock()
+
+
+# --- Stream tokens ---
+def _sign(payload):
+    return hmac.new(STREAM_SECRET, payload.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def session_token(user_id, tier, ttl=STREAM_TOKEN_TTL):
+    # "user_id.tier.expires.nonce.signature"; minted once per signed-in
+    # session. The rendition tier is signed in, so a URL can't be edited
+    # into a better stream.
+    if tier not in transcode.TIERS:
+        raise ValueError(f"unknown tier {tier!r}")
+    payload = f"{user_id}.{tier}.{int(time.time()) + ttl}.{secrets.token_hex(8)}"
+    return f"{payload}.{_sign(payload)}"
+
+
+def check_token(token):
+    # {"user_id", "tier", "expires"}, or None for a forged, malformed or
+    # expired token.
+    payload, _, signature = (token or "").rpartition(".")
+    if not payload or not hmac.compare_digest(signature, _sign(payload)):
+        return None
+    try:
+        user_id, tier, expires, _ = payload.split(".")
+        claims = {"user_id": int(user_id), "tier": tier, "expires": int(expires)}
+    except ValueError:
+        return None
+    if tier not in transcode.TIERS or claims["expires"] <= time.time():
+        return None
+    return claims
+
+
+def audio_url(audio_file, token):
+    return f"{STREAM_URL}/audio/{quote(audio_file)}?token={quote(token)}"
+
+
+def played_url(song_id, token):
+    # The player POSTs here (a beacon) each time a track starts playing.
+    return f"{STREAM_URL}/played?token={quote(token)}&song={int(song_id)}"
+
+
+def _first_beacon(user_id, song_id, now=None):
+    # False for a repeat of the same (user, song) beacon inside
+    # PLAY_REPEAT_INTERVAL. Stale entries are swept as the table grows.
+    now = time.monotonic() if now is None else now
+    key = (user_id, song_id)
+    with _beacons_lock:
+        last = _recent_beacons.get(key)
+        if last is not None and now - last < PLAY_REPEAT_INTERVAL:
+            return False
+        if len(_recent_beacons) >= 10000:
+            for stale in [k for k, t in _recent_beacons.items() if now - t >= PLAY_REPEAT_INTERVAL]:
+                del _recent_beacons[stale]
+        _recent_beacons[key] = now
+        return True
+
+
+def parse_range(header, size):
+    # Only single ranges are supported; browsers never ask audio for more.
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if start == "" and end == "":
+        return None
+    if start == "":
+        length = int(end)
+        if length == 0:
+            return None
+        start = max(size - length, 0)
+        end = size - 1
+    else:
+        start = int(start)
+        end = int(end) if end else size - 1
+        end = min(end, size - 1)
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_empty(self, status, headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+class MetricsRequestHandler(_RequestHandler):
+    token = METRICS_TOKEN
+
+    def do_GET(self):
+        if urlsplit(self.path).path != "/metrics":
+            self._send_empty(404)
+            return
+        if self.token and not hmac.compare_digest(self.headers.get("Authorization", ""), f"Bearer {self.token}"):
+            self._send_empty(401, [("WWW-Authenticate", "Bearer")])
+            return
+        # Prometheus text exposition of this process's query metrics.
+        body = instrument.metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class AudioRequestHandler(_RequestHandler):
+    song_dir = SONG_DIR
+
+    def _resolve(self):
+        path = unquote(urlsplit(self.path).path)
+        if not path.startswith("/audio/"):
+            return None
+        root = os.path.realpath(self.song_dir)
+        full = os.path.realpath(os.path.join(root, path[len("/audio/"):]))
+        if os.path.commonpath([root, full]) != root or not os.path.isfile(full):
+            return None
+        return full
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if not 0 <= length <= MAX_BEACON_BODY:
+            # The body is left unread, so the connection can't be reused.
+            self.close_connection = True
+            self._send_empty(413 if length > MAX_BEACON_BODY else 400)
+            return
+        self.rfile.read(length)
+        if url.path != "/played":
+            self._send_empty(404)
+            return
+        query = parse_qs(url.query)
+        claims = check_token(query.get("token", [None])[0])
+        if claims is None:
+            self._send_empty(403)
+            return
+        try:
+            song_id = int(query.get("song", [""])[0])
+        except ValueError:
+            self._send_empty(400)
+            return
+        if not _first_beacon(claims["user_id"], song_id):
+            self._send_empty(204)
+            return
+        # Imported here: plays pulls in db, which serving audio never needs.
+        import db
+        import plays
+        if not db.song_exists(song_id):
+            self._send_empty(404)
+            return
+        plays.record_play(claims["user_id"], song_id)
+        self._send_empty(204)
+
+    def _serve(self, send_body):
+        claims = check_token(parse_qs(urlsplit(self.path).query).get("token", [None])[0])
+        if claims is None:
+            self._send_empty(403)
+            return
+        full = self._resolve()
+        if full is None:
+            self._send_empty(404)
+            return
+        full, final = transcode.playback_path(full, claims["tier"])
+
+        st = os.stat(full)
+        size = st.st_size
+        etag = f'"{size:x}-{st.st_mtime_ns:x}"'
+        common = [
+            ("ETag", etag),
+            ("Accept-Ranges", "bytes"),
+            # A stand-in original must not be cached under the token's URL;
+            # private, since the URL is only valid for one session.
+            ("Cache-Control", "private, max-age=86400" if final else "no-cache"),
+            ("Last-Modified", formatdate(st.st_mtime, usegmt=True)),
+        ]
+
+        if self.headers.get("If-None-Match") == etag:
+            self._send_empty(304, common)
+            return
+
+        start, end = 0, size - 1
+        status = 200
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if range_header and size and (not if_range or if_range == etag):
+            byte_range = parse_range(range_header, size)
+            if byte_range is None:
+                self._send_empty(416, [("Content-Range", f"bytes */{size}")])
+                return
+            start, end = byte_range
+            status = 206
+
+        length = end - start + 1 if size else 0
+        self.send_response(status)
+        for name, value in common:
+            self.send_header(name, value)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Content-Length", str(length))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+
+        if send_body and length:
+            with open(full, "rb") as f:
+                self._send_file(f, start, length)
+
+    def _send_file(self, f, offset, count):
+        self.wfile.flush()
+        try:
+            self.connection.sendfile(f, offset, count)
+            return
+        except (AttributeError, NotImplementedError):
+            pass
+        # Fallback: copy through a bounded buffer.
+        f.seek(offset)
+        remaining = count
+        while remaining:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            self.wfile.write(chunk)
+            remaining -= len(chunk)
+
+
+def _is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def check_config(host=STREAM_HOST):
+    if not _is_loopback(host) and "TREBLE_STREAM_URL" not in os.environ:
+        raise ValueError(f"TREBLE_STREAM_HOST={host} needs TREBLE_STREAM_URL, the address browsers reach it at")
+
+
+def check_metrics_config(host=METRICS_HOST, token=METRICS_TOKEN):
+    if not _is_loopback(host) and not token:
+        raise ValueError(f"TREBLE_METRICS_HOST={host} needs TREBLE_METRICS_TOKEN")
+
+
+def _serve_in_background(server, name):
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name=name, daemon=True)
+    thread.start()
+    return server
+
+
+def start(song_dir=SONG_DIR, host=STREAM_HOST, port=STREAM_PORT):
+    check_config(host)
+    handler = type("Handler", (AudioRequestHandler,), {"song_dir": song_dir})
+    return _serve_in_background(ThreadingHTTPServer((host, port), handler), "treble-stream")
+
+
+def start_metrics(host=METRICS_HOST, port=METRICS_PORT, token=METRICS_TOKEN):
+    check_metrics_config(host, token)
+    handler = type("Handler", (MetricsRequestHandler,), {"token": token})
+    return _serve_in_background(ThreadingHTTPServer((host, port), handler), "treble-metrics")
+
+
+def _start_or_report(label, start_server):
+    try:
+        return start_server()
+    except OSError as err:
+        # Another worker already owns the port (and serves the same files).
+        print(f"{label} server not started: {err}")
+    except ValueError as err:
+        print(f"❌ {label} server not started: {err}")
+    return False
+
+
+def ensure_started():
+    global _server, _metrics_server
+    if _server is None:
+        with _server_lock:
+            if _server is None:
+                _server = _start_or_report("Stream", start)
+                _metrics_server = _start_or_report("Metrics", start_metrics) if METRICS_PORT else False
+    return _server
+
+
+if __name__ == "__main__":
+    # Run apart from the app, it can only check tokens signed with a shared secret.
+    if "TREBLE_STREAM_SECRET" not in os.environ:
+        sys.exit("❌ Set TREBLE_STREAM_SECRET to the app's value to serve its stream URLs.")
+    try:
+        check_config()
+    except ValueError as err:
+        sys.exit(f"❌ {err}")
+    print(f"Serving {SONG_DIR} on http://{STREAM_HOST}:{STREAM_PORT}/audio/")
+    server = ThreadingHTTPServer((STREAM_HOST, STREAM_PORT), AudioRequestHandler)
+    server.serve_forever()
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# db.py picks its backend at import: point it at a throwaway SQLite file.
+os.environ.setdefault("TREBLE_DB_BACKEND", "sqlite")
+os.environ.setdefault("TREBLE_SQLITE_PATH", os.path.join(tempfile.mkdtemp(prefix="treble-tests-"), "treble.db"))
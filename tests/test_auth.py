@@ -0,0 +1,21 @@
+import sys
+import types
+
+import auth
+
+
+def test_pool_with_streamlit_style_main(tmp_path, monkeypatch):
+    # Streamlit runs the page script as __main__; a pool that re-imported
+    # __main__ in its workers would run it (and here, blow up).
+    script = tmp_path / "main.py"
+    script.write_text("raise RuntimeError('page script re-executed')\n")
+    main = types.ModuleType("__main__")
+    main.__file__ = str(script)
+    monkeypatch.setitem(sys.modules, "__main__", main)
+
+    service = auth.AuthService(workers=2, max_concurrency=2, queue_timeout=5, rounds=4)
+    hashed = service.hash_password("hunter2")
+    assert auth.hash_scheme(hashed) == "bcrypt"
+    assert service.check_password("hunter2", hashed)
+    assert not service.check_password("hunter3", hashed)
+    assert service.stats()["completed"] == 3
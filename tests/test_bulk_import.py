@@ -0,0 +1,74 @@
+import io
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import Bulk_Import
+
+FRAMES = b"\xff\xfb\x90\x00" + bytes(range(256)) * 8
+
+
+def id3v2(body_size, footer=False):
+    size = bytes((body_size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+    return b"ID3\x04\x00" + (b"\x10" if footer else b"\x00") + size + bytes(body_size) + (b"3DI" + bytes(7) if footer else b"")
+
+
+def ape(items=b"x" * 40, header=True):
+    footer = b"APETAGEX" + struct.pack("<IIII", 2000, len(items) + 32, 1, 0x80000000 if header else 0) + bytes(8)
+    return (b"APETAGEX" + bytes(24) if header else b"") + items + footer
+
+
+def span(data):
+    start, end = Bulk_Import.audio_span(io.BytesIO(data), len(data))
+    return data[start:end]
+
+
+@pytest.mark.parametrize("before, after", [
+    (b"", b""),
+    (id3v2(100), b""),
+    (id3v2(100) + id3v2(30), b""),
+    (id3v2(50, footer=True), b""),
+    (b"", b"TAG" + bytes(125)),
+    (b"", ape()),
+    (b"", ape(header=False) + b"TAG" + bytes(125)),
+    (id3v2(100), ape() + b"TAG" + bytes(125)),
+])
+def test_audio_span_strips_tags(before, after):
+    assert span(before + FRAMES + after) == FRAMES
+
+
+def test_audio_span_of_a_tag_only_file_is_empty():
+    assert span(id3v2(20)) == b""
+    assert span(b"TAG" + bytes(125)) == b""
+
+
+@pytest.fixture
+def song_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(Bulk_Import, "SONG_DIR", str(tmp_path))
+    monkeypatch.setattr(Bulk_Import, "PARTIAL_HASH_SIZE", 512)
+    return tmp_path
+
+
+def test_find_duplicates_ignores_tags_and_keeps_the_plain_name(song_dir):
+    other = bytearray(FRAMES)
+    other[-1] ^= 1  # same length and same first PARTIAL_HASH_SIZE bytes
+    short = FRAMES[:400]  # at most PARTIAL_HASH_SIZE: the partial hash is the full one
+    files = {
+        "Song.mp3": FRAMES,
+        "Song (1).mp3": id3v2(64) + FRAMES + b"TAG" + bytes(125),
+        "Song (2).mp3": FRAMES + ape(),
+        "Near miss.mp3": bytes(other),
+        "Intro.mp3": short,
+        "Intro copy.mp3": id3v2(10) + short,
+        "Unique.mp3": FRAMES[:1000],
+    }
+    for name, data in files.items():
+        (song_dir / name).write_bytes(data)
+    with ThreadPoolExecutor(2) as pool:
+        duplicates = Bulk_Import.find_duplicates(sorted(files), pool)
+    assert duplicates == {
+        "Song (1).mp3": "Song.mp3",
+        "Song (2).mp3": "Song.mp3",
+        "Intro copy.mp3": "Intro.mp3",
+    }
@@ -0,0 +1,29 @@
+from cache import cached, catalog_cache, invalidate
+
+
+def counting(results):
+    calls = []
+
+    def query():
+        calls.append(1)
+        return results.pop(0)
+    return query, calls
+
+
+def test_empty_results_are_cached():
+    query, calls = counting([[], [{"genreName": "Pop"}]])
+    genres = cached("test_empty", 60, default=list)(query)
+    assert genres() == [] and genres() == []
+    assert len(calls) == 1
+    invalidate("test_empty")
+    assert genres() == [{"genreName": "Pop"}]
+
+
+def test_failed_query_is_not_cached():
+    query, calls = counting([None, None])
+    titles = cached("test_failed", 60, default=list)(query)
+    assert titles() == [] and titles() == []
+    assert len(calls) == 2
+    count = cached("test_zero", 60)(counting([None, 0])[0])
+    assert count() is None and count() == 0 and count() == 0
+    assert catalog_cache.stats()["hits"] >= 2
@@ -0,0 +1,77 @@
+import threading
+import time
+
+import pytest
+
+import db
+from pool import ConnectionPool
+
+
+@pytest.fixture
+def small_pool(monkeypatch):
+    pool = ConnectionPool(db.backend.connect, size=2, timeout=0.5, ping=db.backend.ping)
+    monkeypatch.setattr(db, "_pool", pool)
+    yield pool
+    pool.close_all()
+
+
+def test_failing_query_returns_its_connection(small_pool, monkeypatch):
+    with monkeypatch.context() as m:
+        m.setattr(db, "USER_EXISTS_QUERY", "SELECT 1 FROM NoSuchTable WHERE name = %s")
+        for _ in range(5):
+            with pytest.raises(db.DatabaseError):
+                db.user_exists("alice")
+    stats = small_pool.stats()
+    assert stats["open"] == stats["idle"] and stats["timeouts"] == 0
+
+    conn = db.get_db_connection()
+    assert conn is not None
+    conn.close()
+
+
+def test_search_rebuild_runs_in_the_background(monkeypatch):
+    catalog = [{"song_id": 1, "Title": "Sunrise", "artist": "", "album": "", "genre": ""}]
+    release_rebuild = threading.Event()
+
+    def load_docs(after_id):
+        if after_id == 0 and threading.current_thread().name == "treble-search-rebuild":
+            release_rebuild.wait(5)
+        return [doc for doc in catalog if doc["song_id"] > after_id]
+
+    monkeypatch.setattr(db, "_load_search_docs", load_docs)
+    monkeypatch.setattr(db, "_search_rebuilding", False)
+    old = db.sync_search_index(full=True)
+
+    # Renamed song: only a full rebuild drops the stale title.
+    catalog[0] = dict(catalog[0], Title="Moonlight")
+    monkeypatch.setattr(db, "_search_built_at", time.monotonic() - db.SEARCH_REBUILD_INTERVAL - 1)
+    assert db.sync_search_index() is old
+    assert db.get_search_index() is old and old.search("sunrise")[1] == 1
+
+    release_rebuild.set()
+    deadline = time.monotonic() + 5
+    while db._search_rebuilding and time.monotonic() < deadline:
+        time.sleep(0.01)
+    new = db.get_search_index()
+    assert new is not old
+    assert new.search("sunrise")[1] == 0 and new.search("moonlight")[1] == 1
+
+
+def test_legacy_password_gauge():
+    import hashlib
+    import instrument
+    import migrate
+    assert migrate.migrate()
+    conn = db.get_db_connection()
+    cur = conn.cursor()
+    cur.execute("INSERT INTO Users (name, password, subscription_type, date_joined) VALUES (%s, %s, %s, %s)",
+                ("legacy", hashlib.sha256(b"hunter2").hexdigest(), "Free", "2020-01-01"))
+    conn.commit()
+    cur.close()
+    conn.close()
+    db.invalidate("legacy_passwords")
+    assert "treble_users_legacy_passwords 1\n" in instrument.metrics.render()
+
+    assert db.login_user("legacy", "hunter2")
+    db.invalidate("legacy_passwords")
+    assert "treble_users_legacy_passwords 0\n" in instrument.metrics.render()
@@ -0,0 +1,96 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import db
+import plays
+from trending import Leaderboard
+
+
+@pytest.fixture
+def board(monkeypatch):
+    board = Leaderboard(size=10)
+    monkeypatch.setattr(plays, "leaderboard", board)
+    return board
+
+
+@pytest.fixture
+def inserted(monkeypatch):
+    batches = []
+    monkeypatch.setattr(db, "insert_play_events", lambda events: batches.append(list(events)) or True)
+    return batches
+
+
+def test_flush_writes_one_batch_and_feeds_the_leaderboard(board, inserted):
+    buffer = plays.PlayBuffer(flush_size=100)
+    for user_id, song_id in [(1, 5), (2, 5), (1, 6)]:
+        buffer.record(user_id, song_id)
+    assert buffer.flush() == 3
+    assert [(user_id, song_id) for user_id, song_id, _ in inserted[0]] == [(1, 5), (2, 5), (1, 6)]
+    assert buffer.flush() == 0 and len(inserted) == 1
+    assert [entry["song_id"] for entry in board.top(2)] == [5, 6]
+    stats = buffer.stats()
+    assert (stats["buffered"], stats["recorded"], stats["flushed"], stats["flushes"]) == (0, 3, 3, 1)
+
+
+def test_failed_flush_keeps_plays_in_order(board, monkeypatch):
+    buffer = plays.PlayBuffer(flush_size=100, limit=4)
+    monkeypatch.setattr(db, "insert_play_events", lambda events: False)
+    buffer.record(1, 1)
+    buffer.record(1, 2)
+    assert buffer.flush() == 0
+    buffer.record(1, 3)
+    buffer.record(1, 4)
+    buffer.record(1, 5)  # over the limit: the oldest play goes
+    batches = []
+    monkeypatch.setattr(db, "insert_play_events", lambda events: batches.append(list(events)) or True)
+    assert buffer.flush() == 4
+    assert [song_id for _, song_id, _ in batches[0]] == [2, 3, 4, 5]
+    assert buffer.stats()["dropped"] == 1
+    assert not board.loaded and len(board.top(10)) == 4
+
+
+def test_full_buffer_wakes_the_flush_thread(board, monkeypatch):
+    flushed = threading.Event()
+    monkeypatch.setattr(db, "insert_play_events", lambda events: flushed.set() or True)
+    monkeypatch.setattr(db, "refresh_play_counts", lambda: False)
+    buffer = plays.PlayBuffer(flush_size=3, flush_interval=60)
+    buffer.start()
+    buffer.record(1, 1)
+    buffer.record(1, 2)
+    assert not flushed.wait(0.2)
+    buffer.record(1, 3)
+    assert flushed.wait(5)
+
+
+def test_refresh_loads_the_leaderboard_from_play_counts(board):
+    import migrate
+    assert migrate.migrate()
+    conn = db.get_db_connection()
+    cur = conn.cursor()
+    cur.execute("INSERT INTO Users (name, password, subscription_type, date_joined) VALUES (%s, %s, %s, %s)",
+                ("listener", "x", "Free", "2020-01-01"))
+    user_id = cur.lastrowid
+    song_ids = []
+    for title in ["Old", "Hot", "Warm"]:
+        cur.execute("INSERT INTO Songs (Title, audioFile, artistId, albumId, genreId, releaseDate) "
+                    "VALUES (%s, %s, 1, 1, 2, %s)", (title, f"{title}.mp3", "2020-01-01"))
+        song_ids.append(cur.lastrowid)
+    conn.commit()
+    cur.close()
+    conn.close()
+    old, hot, warm = song_ids
+
+    buffer = plays.PlayBuffer(flush_size=100)
+    now = datetime.now()
+    for _ in range(3):
+        buffer.record(user_id, old, now - timedelta(days=2))
+        buffer.record(user_id, hot, now)
+    buffer.record(user_id, warm, now)
+    assert buffer.flush() == 7
+    buffer.refresh()
+    top = {entry["song_id"]: entry for entry in board.top(10)}
+    assert board.loaded and [entry["song_id"] for entry in board.top(3)] == [hot, warm, old]
+    assert (top[hot]["plays_24h"], top[hot]["plays_7d"]) == (3, 3)
+    assert (top[old]["plays_24h"], top[old]["plays_7d"]) == (0, 3)
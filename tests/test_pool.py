@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from pool import ConnectionPool, PoolExhausted
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.in_transaction = False
+        self.fail_rollback = False
+
+    def rollback(self):
+        if self.fail_rollback:
+            raise RuntimeError("connection lost")
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(size=2, timeout=0.5):
+    opened = []
+
+    def connect():
+        opened.append(FakeConnection())
+        return opened[-1]
+    return ConnectionPool(connect, size=size, timeout=timeout, reconnect_delay=0), opened
+
+
+def test_exhausted_pool_times_out():
+    pool, _ = make_pool(size=2, timeout=0.1)
+    held = [pool.get_connection(), pool.get_connection()]
+    with pytest.raises(PoolExhausted):
+        pool.get_connection()
+    assert pool.stats()["timeouts"] == 1
+    for conn in held:
+        conn.close()
+    assert pool.stats()["idle"] == 2
+
+
+def test_release_reuses_and_rolls_back():
+    pool, opened = make_pool(size=1)
+    conn = pool.get_connection()
+    conn.in_transaction = True
+    conn.close()
+    conn.close()  # a second close is a no-op
+    again = pool.get_connection()
+    assert len(opened) == 1 and not opened[0].in_transaction
+    again.close()
+
+
+def test_waiter_gets_a_released_connection():
+    pool, _ = make_pool(size=1, timeout=2)
+    held = pool.get_connection()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.get_connection()))
+    waiter.start()
+    time.sleep(0.1)
+    held.close()
+    waiter.join(2)
+    assert got and pool.stats()["timeouts"] == 0
+
+
+def test_discard_wakes_a_waiter_to_open_a_new_connection():
+    pool, opened = make_pool(size=1, timeout=2)
+    held = pool.get_connection()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.get_connection()))
+    waiter.start()
+    time.sleep(0.1)
+    # A failed rollback discards the connection instead of returning it.
+    opened[0].in_transaction = opened[0].fail_rollback = True
+    start = time.perf_counter()
+    held.close()
+    waiter.join(2)
+    assert got and time.perf_counter() - start < 1
+    assert len(opened) == 2 and opened[0].closed
+    assert pool.stats()["open"] == 1
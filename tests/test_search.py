@@ -0,0 +1,41 @@
+import pytest
+
+from benchmarks.search_bench import make_catalog
+from search import SearchIndex
+
+
+@pytest.fixture(scope="module")
+def index():
+    index = SearchIndex()
+    index.add_many(make_catalog(3000))
+    # "kar" expands by prefix to both words in the title field, at equal score.
+    index.add_many([
+        {"song_id": 100001, "Title": "Karma", "artist": "", "album": "", "genre": ""},
+        {"song_id": 100002, "Title": "Karaoke", "artist": "", "album": "", "genre": ""},
+        {"song_id": 100003, "Title": "Karma", "artist": "", "album": "", "genre": ""},
+    ])
+    return index
+
+
+def paged(index, query, limit, **kwargs):
+    results, after = [], None
+    while True:
+        page, _ = index.search(query, limit=limit, after=after, **kwargs)
+        if not page:
+            return results
+        results += page
+        after = (page[-1]["score"], page[-1]["song_id"])
+
+
+@pytest.mark.parametrize("query", ["kar", "ka", "kari", "ri", "love", "sol tor", "mer nor pal", "Ka Ri", "ana"])
+@pytest.mark.parametrize("limit", [1, 7, 24])
+def test_pages_concatenate_to_full_result(index, query, limit):
+    full, total = index.search(query)
+    assert len(full) == total
+    assert [song["song_id"] for song in paged(index, query, limit)] == [song["song_id"] for song in full]
+
+
+def test_equal_scores_share_a_level(index):
+    full, _ = index.search("kar")
+    ranked = [(-song["score"], song["song_id"]) for song in full]
+    assert ranked == sorted(ranked)
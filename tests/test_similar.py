@@ -0,0 +1,64 @@
+import random
+
+import numpy as np
+import pytest
+
+import similar
+from similar import affected_songs, pair_keys, top_neighbours
+
+
+def random_pairs(rng, songs=40, playlists=15, size=120):
+    return sorted({(rng.randint(1, songs), rng.randint(1, playlists)) for _ in range(size)})
+
+
+def brute_force(pairs, song_ids, top_n):
+    members = {}
+    for song_id, playlist_id in pairs:
+        members.setdefault(song_id, set()).add(playlist_id)
+    result = {}
+    for song_id in song_ids:
+        mine = members.get(song_id, set())
+        scored = [(other, round(len(mine & theirs) / np.sqrt(len(mine) * len(theirs)), 4))
+                  for other, theirs in members.items() if other != song_id and mine & theirs]
+        result[song_id] = sorted(scored, key=lambda pair: (-pair[1], pair[0]))[:top_n]
+    return result
+
+
+def test_small_catalog_by_hand():
+    keys = pair_keys([(1, 10), (2, 10), (1, 11), (3, 11), (2, 12), (4, 13)])
+    neighbours = top_neighbours(keys, [1, 2, 4, 99], top_n=5)
+    assert neighbours[1] == [(3, 0.7071), (2, 0.5)]
+    assert neighbours[2] == [(1, 0.5)]
+    assert neighbours[4] == [] and neighbours[99] == []
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("top_n", [1, 3, 50])
+def test_matches_brute_force_cosine(seed, top_n, monkeypatch):
+    monkeypatch.setattr(similar, "SIMILAR_CHUNK_ROWS", 7)  # several chunks
+    rng = random.Random(seed)
+    pairs = random_pairs(rng)
+    song_ids = list(range(1, 45))
+    assert top_neighbours(pair_keys(pairs), song_ids, top_n) == brute_force(pairs, song_ids, top_n)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_unaffected_songs_keep_their_neighbours(seed):
+    rng = random.Random(seed)
+    old = random_pairs(rng)
+    new = set(old)
+    for _ in range(rng.randint(1, 4)):
+        new.discard(rng.choice(old))
+        new.add((rng.randint(1, 45), rng.randint(1, 17)))
+    old_keys, new_keys = pair_keys(old), pair_keys(sorted(new))
+    song_ids = list(range(1, 46))
+    before = top_neighbours(old_keys, song_ids, 50)
+    after = top_neighbours(new_keys, song_ids, 50)
+    affected = set(affected_songs(old_keys, new_keys).tolist())
+    assert {song_id for song_id in song_ids if before[song_id] != after[song_id]} <= affected
+    assert {song_id for song_id, _ in set(old) ^ new} <= affected
+
+
+def test_no_change_affects_nothing():
+    keys = pair_keys(random_pairs(random.Random(1)))
+    assert len(affected_songs(keys, keys)) == 0
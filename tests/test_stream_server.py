@@ -0,0 +1,129 @@
+import http.client
+import time
+from urllib.parse import quote, urlsplit
+
+import pytest
+
+import stream_server
+import transcode
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    song_dir = tmp_path_factory.mktemp("songs")
+    (song_dir / "a.mp3").write_bytes(b"\xff\xfb" + bytes(1000))
+    server = stream_server.start(song_dir=str(song_dir), host="127.0.0.1", port=0)
+    yield server
+    server.shutdown()
+
+
+def request(server, path, method="GET", headers=None):
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=5)
+    conn.request(method, path, headers=headers or {})
+    response = conn.getresponse()
+    body = response.read()
+    conn.close()
+    return response.status, body
+
+
+def test_signed_url_streams(server):
+    token = stream_server.session_token(7, "low")
+    assert stream_server.check_token(token)["user_id"] == 7
+    status, body = request(server, f"/audio/a.mp3?token={quote(token)}", headers={"Range": "bytes=0-1"})
+    assert (status, body) == (206, b"\xff\xfb")
+
+
+@pytest.mark.parametrize("token", [None, "", "7.high.9999999999.00.deadbeef"])
+def test_unsigned_url_is_refused(server, token):
+    path = "/audio/a.mp3" if token is None else f"/audio/a.mp3?token={quote(token)}"
+    assert request(server, path)[0] == 403
+
+
+def test_expired_or_tampered_token_is_refused(server):
+    assert request(server, f"/audio/a.mp3?token={quote(stream_server.session_token(7, 'low', ttl=-1))}")[0] == 403
+    payload, _, signature = stream_server.session_token(7, "low").rpartition(".")
+    for forged in ["8" + payload[1:], payload.replace(".low.", ".high.")]:
+        assert stream_server.check_token(f"{forged}.{signature}") is None
+        assert request(server, f"/audio/a.mp3?token={quote(forged + '.' + signature)}")[0] == 403
+
+
+def test_tier_comes_from_the_token(server, monkeypatch):
+    served = []
+    monkeypatch.setattr(transcode, "playback_path", lambda path, tier: served.append(tier) or (path, True))
+    token = quote(stream_server.session_token(7, "low"))
+    assert request(server, f"/audio/a.mp3?token={token}&tier=high", method="HEAD")[0] == 200
+    assert served == ["low"]
+
+
+def test_unknown_tier_is_refused():
+    with pytest.raises(ValueError):
+        stream_server.session_token(7, "source")
+    with pytest.raises(ValueError):
+        transcode.playback_path("a.mp3", None)
+
+
+def test_external_bind_needs_public_url(monkeypatch):
+    monkeypatch.delenv("TREBLE_STREAM_URL", raising=False)
+    stream_server.check_config("127.0.0.1")
+    with pytest.raises(ValueError):
+        stream_server.check_config("0.0.0.0")
+    monkeypatch.setenv("TREBLE_STREAM_URL", "https://music.example.com/stream")
+    stream_server.check_config("0.0.0.0")
+
+
+def test_metrics_only_on_their_own_listener(server):
+    assert request(server, "/metrics")[0] == 403
+    metrics = stream_server.start_metrics(host="127.0.0.1", port=0, token="")
+    try:
+        status, body = request(metrics, "/metrics")
+        assert status == 200 and b"# TYPE" in body
+        assert request(metrics, "/audio/a.mp3")[0] == 404
+    finally:
+        metrics.shutdown()
+
+
+def test_metrics_token():
+    with pytest.raises(ValueError):
+        stream_server.check_metrics_config("0.0.0.0", "")
+    metrics = stream_server.start_metrics(host="127.0.0.1", port=0, token="s3cret")
+    try:
+        assert request(metrics, "/metrics")[0] == 401
+        assert request(metrics, "/metrics", headers={"Authorization": "Bearer s3cret"})[0] == 200
+    finally:
+        metrics.shutdown()
+
+
+def test_played_beacon_records_the_token_user(server, monkeypatch):
+    import db
+    import plays
+    recorded = []
+    monkeypatch.setattr(plays, "record_play", lambda user_id, song_id: recorded.append((user_id, song_id)))
+    monkeypatch.setattr(db, "song_exists", lambda song_id: True)
+    token = stream_server.session_token(7, "low")
+    path = urlsplit(stream_server.played_url(42, token))
+    assert request(server, f"{path.path}?{path.query}", method="POST")[0] == 204
+    assert request(server, "/played?song=42", method="POST")[0] == 403
+    assert request(server, f"/played?token={quote(token)}&song=x", method="POST")[0] == 400
+    assert recorded == [(7, 42)]
+
+
+def test_played_beacon_is_deduped_and_checked(server, monkeypatch):
+    import db
+    import plays
+    recorded = []
+    monkeypatch.setattr(plays, "record_play", lambda user_id, song_id: recorded.append((user_id, song_id)))
+    monkeypatch.setattr(db, "song_exists", lambda song_id: song_id != 404)
+    monkeypatch.setattr(stream_server, "_recent_beacons", {})
+    token = quote(stream_server.session_token(8, "low"))
+    for _ in range(3):
+        assert request(server, f"/played?token={token}&song=5", method="POST")[0] == 204
+    assert request(server, f"/played?token={token}&song=6", method="POST")[0] == 204
+    assert request(server, f"/played?token={token}&song=404", method="POST")[0] == 404
+    assert recorded == [(8, 5), (8, 6)]
+    assert stream_server._first_beacon(8, 5, now=time.monotonic() + stream_server.PLAY_REPEAT_INTERVAL)
+
+
+@pytest.mark.parametrize("length, status", [("100000000", 413), ("-5", 400), ("lots", 400)])
+def test_played_beacon_bounds_the_body(server, length, status):
+    token = quote(stream_server.session_token(8, "low"))
+    assert request(server, f"/played?token={token}&song=5", method="POST", headers={"Content-Length": length})[0] == status
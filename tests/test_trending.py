@@ -0,0 +1,46 @@
+import random
+
+from trending import Leaderboard
+
+
+def rows(counts):
+    return [{"song_id": song_id, "plays_24h": p24, "plays_7d": p7} for song_id, (p24, p7) in counts.items()]
+
+
+def ranking(board, k=100):
+    return [(entry["song_id"], entry["plays_24h"], entry["plays_7d"]) for entry in board.top(k)]
+
+
+def test_load_ranks_by_24h_then_7d_then_id_and_keeps_size():
+    board = Leaderboard(size=3)
+    board.load(rows({1: (5, 9), 2: (5, 20), 3: (7, 7), 4: (0, 50), 5: (5, 20)}))
+    assert ranking(board) == [(3, 7, 7), (2, 5, 20), (5, 5, 20)]
+    assert board.loaded and board.stats()["entries"] == 3
+
+
+def test_add_plays_moves_songs_and_evicts_the_last():
+    board = Leaderboard(size=3)
+    board.load(rows({1: (10, 10), 2: (8, 8), 3: (6, 6)}))
+    version = board.version
+    board.add_plays({3: 3})
+    assert ranking(board) == [(1, 10, 10), (3, 9, 9), (2, 8, 8)]
+    board.add_plays({9: 9})  # off the board: counted from zero, and beats song 2
+    assert ranking(board) == [(1, 10, 10), (3, 9, 9), (9, 9, 9)]
+    board.add_plays({7: 1})  # too few to get on
+    assert [song_id for song_id, _, _ in ranking(board)] == [1, 3, 9]
+    assert board.version == version + 3
+
+
+def test_increments_match_a_full_reload():
+    rng = random.Random(7)
+    counts = {song_id: (rng.randint(0, 20),) * 2 for song_id in range(1, 60)}
+    board = Leaderboard(size=len(counts))
+    board.load(rows(counts))
+    for _ in range(200):
+        plays = {rng.randint(1, 59): rng.randint(1, 3) for _ in range(rng.randint(1, 5))}
+        board.add_plays(plays)
+        for song_id, n in plays.items():
+            counts[song_id] = (counts[song_id][0] + n, counts[song_id][1] + n)
+    fresh = Leaderboard(size=len(counts))
+    fresh.load(rows(counts))
+    assert ranking(board) == ranking(fresh)
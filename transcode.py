@@ -0,0 +1,125 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from mutagen.mp3 import MP3
+
+# --- Config ---
+RENDITION_DIR = os.environ.get("TREBLE_RENDITION_DIR", os.path.join(os.getcwd(), "renditions"))
+FFMPEG = shutil.which(os.environ.get("TREBLE_FFMPEG", "ffmpeg"))
+# MP3 at these bitrates (kbps); every browser plays it and the stream
+# server's Content-Type stays the same.
+TIERS = {"low": 64, "high": 192}
+TIER_BY_SUBSCRIPTION = {"Free": "low", "Premium": "high"}
+DEFAULT_TIER = "low"
+TRANSCODE_WORKERS = int(os.environ.get("TREBLE_TRANSCODE_WORKERS", "2"))
+TRANSCODE_TIMEOUT = 300
+
+_bitrates = {}
+_pending = set()
+_lock = threading.Lock()
+_executor = None
+
+
+def tier_for(subscription_type):
+    return TIER_BY_SUBSCRIPTION.get(subscription_type, DEFAULT_TIER)
+
+
+def _key(path):
+    # Renditions are keyed by the source's path, size and mtime, so a
+    # replaced file gets new ones without hashing the audio.
+    st = os.stat(path)
+    return hashlib.sha1(f"{os.path.basename(path)}:{st.st_size}:{st.st_mtime_ns}".encode()).hexdigest()[:16]
+
+
+def source_bitrate(path):
+    digest = _key(path)
+    with _lock:
+        kbps = _bitrates.get(digest)
+    if kbps is None:
+        try:
+            kbps = MP3(path).info.bitrate // 1000
+        except Exception:
+            kbps = 0  # unknown: always worth a rendition
+        with _lock:
+            _bitrates[digest] = kbps
+    return kbps
+
+
+def rendition_path(path, tier):
+    return os.path.join(RENDITION_DIR, f"{_key(path)}_{tier}.mp3")
+
+
+def needs_rendition(path, tier):
+    # No point re-encoding a source that is already at or below the tier.
+    kbps = TIERS.get(tier)
+    return kbps is not None and FFMPEG is not None and not 0 < source_bitrate(path) <= kbps
+
+
+def transcode(path, tier):
+    out = rendition_path(path, tier)
+    if os.path.exists(out):
+        return out
+    os.makedirs(RENDITION_DIR, exist_ok=True)
+    tmp = f"{out}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        subprocess.run([FFMPEG, "-nostdin", "-v", "error", "-y", "-i", path, "-map", "0:a:0",
+                        "-c:a", "libmp3lame", "-b:a", f"{TIERS[tier]}k", "-map_metadata", "-1", "-f", "mp3", tmp],
+                       check=True, timeout=TRANSCODE_TIMEOUT, capture_output=True)
+        os.replace(tmp, out)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return out
+
+
+def make_renditions(path, tiers=TIERS):
+    # Import-time: every tier the source needs. Returns {tier: path}.
+    made = {}
+    for tier in tiers:
+        if needs_rendition(path, tier):
+            try:
+                made[tier] = transcode(path, tier)
+            except Exception as e:
+                print(f"⚠️ Transcode to {tier} failed for {path}: {e}")
+    return made
+
+
+def _background(path, tier, key):
+    try:
+        transcode(path, tier)
+    except Exception as e:
+        print(f"⚠️ Transcode to {tier} failed for {path}: {e}")
+    finally:
+        with _lock:
+            _pending.discard(key)
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=TRANSCODE_WORKERS, thread_name_prefix="treble-transcode")
+        return _executor
+
+
+def playback_path(path, tier):
+    # The file to stream for `tier`, and whether it is final. A missing
+    # rendition is queued and the original served meanwhile.
+    if tier not in TIERS:
+        raise ValueError(f"unknown tier {tier!r}")
+    if not needs_rendition(path, tier):
+        return path, True
+    out = rendition_path(path, tier)
+    if os.path.exists(out):
+        return out, True
+    key = (out, tier)
+    with _lock:
+        queued = key in _pending
+        _pending.add(key)
+    if not queued:
+        _get_executor().submit(_background, path, tier, key)
+    return path, False
@@ -0,0 +1,74 @@
+import bisect
+import os
+import threading
+from datetime import datetime
+
+# --- Config ---
+TRENDING_SIZE = int(os.environ.get("TREBLE_TRENDING_SIZE", "100"))
+
+
+class Leaderboard:
+    # Top songs by (plays_24h, plays_7d), kept sorted so readers get the
+    # top K as a slice. Full loads come from SongPlayCounts after each
+    # refresh; in between, flushed plays are applied as increments.
+    def __init__(self, size=TRENDING_SIZE):
+        self.size = size
+        self._counts = {}
+        self._ranked = []
+        self._lock = threading.Lock()
+        self.version = 0
+        self.updated_at = None
+        self.loaded = False
+
+    @staticmethod
+    def _key(song_id, counts):
+        return (-counts[0], -counts[1], song_id)
+
+    def load(self, rows):
+        counts = {row["song_id"]: (row["plays_24h"], row["plays_7d"]) for row in rows}
+        ranked = sorted(self._key(song_id, c) for song_id, c in counts.items())[:self.size]
+        with self._lock:
+            self._counts = {key[2]: counts[key[2]] for key in ranked}
+            self._ranked = ranked
+            self._touch()
+            self.loaded = True
+
+    def add_plays(self, plays):
+        # plays: {song_id: new plays}. Counts only grow here; decay happens
+        # at the next full load.
+        with self._lock:
+            for song_id, n in plays.items():
+                old = self._counts.get(song_id)
+                if old is not None:
+                    del self._ranked[bisect.bisect_left(self._ranked, self._key(song_id, old))]
+                    base = old
+                else:
+                    # Not on the board at the last load, so its real count is
+                    # at most the last entry's; start from zero (a lower bound).
+                    base = (0, 0)
+                counts = (base[0] + n, base[1] + n)
+                key = self._key(song_id, counts)
+                if len(self._ranked) < self.size or key < self._ranked[-1]:
+                    bisect.insort(self._ranked, key)
+                    self._counts[song_id] = counts
+                    if len(self._ranked) > self.size:
+                        dropped = self._ranked.pop()
+                        del self._counts[dropped[2]]
+            self._touch()
+
+    def _touch(self):
+        self.version += 1
+        self.updated_at = datetime.now()
+
+    def top(self, k):
+        with self._lock:
+            return [{"song_id": song_id, "plays_24h": -p24, "plays_7d": -p7}
+                    for p24, p7, song_id in self._ranked[:k]]
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._ranked), "version": self.version,
+                    "updated_at": self.updated_at, "loaded": self.loaded}
+
+
+leaderboard = Leaderboard()